@@ -0,0 +1,238 @@
+"""Timed scheduling scenarios on a synthetic school.
+
+    python -m benchmarks.run [--teachers N] [--part-time F] [--absence-rate F]
+                             [--history-years N] [--seed N] [--repeat N] [--format xlsx|csv]
+                             [--sheets N] [--only TEXT] [--json FILE] [--compare FILE]
+
+Each scenario starts from a fresh copy of a prepared database and reports the median and
+best wall time over --repeat runs, the SQL statements it ran, and the peak Python memory
+(from a separate traced run, so tracing does not slow the timed runs). Save a run with
+--json and pass it to --compare on a later run to see what got faster or slower.
+"""
+import argparse
+import importlib.util
+import json
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from benchmarks.school import School, generate_school, load_school, write_timetable
+from oncall import db_config, logic
+from oncall.helper_classes import OnCallRangeSchedule, OnCallSchedule
+
+# a change is only reported as faster or slower beyond this ratio
+NOISE: float = 0.10
+
+
+class Measurement(NamedTuple):
+    name: str
+    median_ms: float
+    best_ms: float
+    queries: int
+    peak_kib: float
+
+
+class QueryCounter:
+    """Counts the SQL statements run on this thread's pooled connection while active;
+    statements run by triggers are not counted separately."""
+
+    def __init__(self):
+        self.count: int = 0
+
+    def trace(self, statement: str) -> None:
+        if not statement.startswith("--"):
+            self.count += 1
+
+    def __enter__(self):
+        db_config.get_pool().get_connection().set_trace_callback(self.trace)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        db_config.get_pool().get_connection().set_trace_callback(None)
+
+
+class Scenario(NamedTuple):
+    name: str
+    # which prepared database the scenario starts from: "empty" or "school"
+    database: str
+    run: Callable[[], object]
+
+
+class Bench:
+    """Prepares the databases for a school and measures scenarios against them."""
+
+    def __init__(self, school: School, workdir: Path, timetable_format: str = "xlsx", sheets: int = 1):
+        self.school = school
+        self.workdir = workdir
+        self.timetable = write_timetable(school, str(workdir / f"timetable.{timetable_format}"), sheets)
+        self.databases: dict[str, Path] = {
+            "empty": self.prepare("empty.db", None),
+            "school": self.prepare("school.db", lambda: load_school(school, self.timetable)),
+        }
+        years: list[str] = list(school.days)
+        self.current_days: list[str] = school.days[years[-1]]
+        # the last complete year of history, for the totals queries
+        self.history_year: str = years[-2] if len(years) > 1 else years[-1]
+
+    def prepare(self, name: str, fill: Callable | None) -> Path:
+        path: Path = self.workdir / name
+        self.use(path)
+        db_config.initializeDB()
+        if fill:
+            fill()
+        # closing the last connection folds the WAL into the file so it can be copied
+        db_config.close_all_pools()
+        return path
+
+    def use(self, path: Path) -> None:
+        db_config.close_all_pools()
+        db_config.set_database_path(str(path))
+        logic.clear_cache()
+
+    def fresh(self, database: str) -> None:
+        """Point the app at a new copy of a prepared database."""
+        path: Path = self.workdir / "run.db"
+        self.use(self.workdir / "scratch.db")
+        for suffix in ("", "-wal", "-shm"):
+            Path(f"{path}{suffix}").unlink(missing_ok=True)
+        shutil.copyfile(self.databases[database], path)
+        self.use(path)
+
+    def measure(self, scenario: Scenario, repeat: int = 5) -> Measurement:
+        times: list[float] = []
+        queries: int = 0
+        for _ in range(repeat):
+            self.fresh(scenario.database)
+            with QueryCounter() as counter:
+                start: float = time.perf_counter()
+                scenario.run()
+                times.append((time.perf_counter() - start) * 1000)
+            queries = counter.count
+        self.fresh(scenario.database)
+        tracemalloc.start()
+        try:
+            scenario.run()
+            peak: int = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        db_config.close_all_pools()
+        return Measurement(scenario.name, statistics.median(times), min(times), queries, peak / 1024)
+
+    def scenarios(self) -> list[Scenario]:
+        day: str = self.current_days[min(10, len(self.current_days) - 1)]
+        month: list[str] = self.current_days[:20]
+        return [
+            Scenario("import timetable", "empty", lambda: import_timetable(self.timetable)),
+            Scenario(
+                "import timetable (streaming)",
+                "empty",
+                lambda: logic.import_schedule_streaming(self.timetable),
+            ),
+            Scenario(
+                "re-import unchanged timetable",
+                "school",
+                lambda: logic.import_schedule_streaming(self.timetable),
+            ),
+            Scenario("schedule one day", "school", lambda: schedule_day(day)),
+            Scenario(
+                f"schedule {len(month)} days",
+                "school",
+                lambda: schedule_range(month[0], month[-1]),
+            ),
+            Scenario("on-call totals for a year", "school", lambda: logic.get_oncall_totals(self.history_year)),
+        ]
+
+    def run(self, repeat: int = 5, only: str | None = None) -> list[Measurement]:
+        return [
+            self.measure(scenario, repeat)
+            for scenario in self.scenarios()
+            if only is None or only in scenario.name
+        ]
+
+
+def import_timetable(path: str) -> None:
+    logic.apply_schedule_import(logic.load_schedule_from_file(path))
+
+
+def schedule_day(day: str) -> None:
+    schedule = OnCallSchedule.from_snapshot(logic.load_day_snapshot(day))
+    schedule.schedule_oncalls()
+    logic.save_oncall_changes(schedule.get_schedule(), [])
+
+
+def schedule_range(start: str, end: str) -> None:
+    schedule = OnCallRangeSchedule(start, end)
+    schedule.schedule_oncalls()
+    schedule.save()
+
+
+def print_report(results: list[Measurement], baseline: dict | None = None, file=None) -> None:
+    file = file or sys.stdout
+    header = f"{'scenario':<32} {'median ms':>10} {'best ms':>9} {'queries':>8} {'peak KiB':>9}"
+    print(header + ("  vs baseline" if baseline else ""), file=file)
+    for result in results:
+        line = (
+            f"{result.name:<32} {result.median_ms:10.1f} {result.best_ms:9.1f} "
+            f"{result.queries:8d} {result.peak_kib:9.0f}"
+        )
+        if baseline and result.name in baseline:
+            ratio: float = result.median_ms / max(baseline[result.name]["median_ms"], 1e-9)
+            verdict: str = "slower" if ratio > 1 + NOISE else "faster" if ratio < 1 - NOISE else "same"
+            line += f"  {ratio:5.2f}x {verdict}"
+        print(line, file=file)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.split("\n")[0])
+    parser.add_argument("--teachers", type=int, default=120)
+    parser.add_argument("--part-time", type=float, default=0.15, help="share of part time teachers")
+    parser.add_argument("--absence-rate", type=float, default=0.05, help="chance a teacher is away on a day")
+    parser.add_argument("--history-years", type=int, default=2, help="past school years of on-calls")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--format",
+        choices=("xlsx", "csv"),
+        # writing the workbook needs xlsxwriter, which the app itself does not
+        default="xlsx" if importlib.util.find_spec("xlsxwriter") else "csv",
+        help="timetable file type (default: xlsx when xlsxwriter is installed)",
+    )
+    parser.add_argument("--sheets", type=int, default=1, help="sheets in an xlsx timetable")
+    parser.add_argument("--only", help="run only the scenarios whose name contains this")
+    parser.add_argument("--json", help="save the results to this file")
+    parser.add_argument("--compare", help="compare with results saved by --json")
+    args = parser.parse_args(argv)
+
+    school: School = generate_school(
+        args.teachers, args.part_time, args.absence_rate, args.history_years, seed=args.seed
+    )
+    baseline: dict | None = None
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+    with tempfile.TemporaryDirectory() as workdir:
+        results: list[Measurement] = Bench(school, Path(workdir), args.format, args.sheets).run(
+            args.repeat, args.only
+        )
+        db_config.close_all_pools()
+    print_report(results, baseline)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(
+                {
+                    "settings": {key: value for key, value in vars(args).items() if key not in ("json", "compare")},
+                    "results": {result.name: result._asdict() for result in results},
+                },
+                file,
+                indent=2,
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,150 @@
+"""Seeded generator of realistic synthetic schools for the benchmarks.
+
+A school has N teachers, most full time (teaching three of the four periods) and a share
+part time (teaching only the morning or the afternoon block), a daily absence rate, and
+several past school years of on-call history. The same seed always gives the same school.
+"""
+import csv
+import random
+from datetime import date, timedelta
+from typing import NamedTuple
+
+from oncall import db_config, logic
+
+TIMETABLE_HEADER: list[str] = ["Teacher", "P1", "P2", "Lunch", "P3", "P4"]
+SUBJECTS: list[str] = ["MPM", "ENG", "SNC", "CGC", "FSF", "PPL", "AVI", "TMJ", "ICS", "CHC"]
+HALVES: tuple[str, str] = ("1st", "2nd")
+
+
+class School(NamedTuple):
+    """Everything generated for one synthetic school."""
+    timetable: list[list[str]]
+    # school year -> that year's school days, oldest year first; the last year is current
+    days: dict[str, list[str]]
+    # date -> rows in get_absences_from_db format, for the current year's days
+    absences: dict[str, list[list]]
+    # past years' on-calls in get_schedule format
+    history: list[list]
+
+
+def school_days(start_year: int) -> list[str]:
+    """Weekdays from the first of September to the end of June of a school year."""
+    day, end = date(start_year, 9, 1), date(start_year + 1, 6, 30)
+    days: list[str] = []
+    while day <= end:
+        if day.weekday() < 5:
+            days.append(day.strftime("%Y%m%d"))
+        day += timedelta(days=1)
+    return days
+
+
+def course(rng: random.Random) -> str:
+    grade: int = rng.randint(1, 4)
+    return f"{rng.choice(SUBJECTS)}{grade}D-0{rng.randint(1, 9)} (R-{rng.randint(100, 399)})"
+
+
+def generate_timetable(teachers: int, part_time: float, rng: random.Random) -> list[list[str]]:
+    """Timetable rows in the layout of a school export: name, P1, P2, Lunch, P3, P4."""
+    rows: list[list[str]] = []
+    for n in range(1, teachers + 1):
+        if rng.random() < part_time:
+            taught: set[int] = set(rng.choice(((1, 2), (3, 4))))
+        else:
+            taught = {1, 2, 3, 4} - {rng.randint(1, 4)}
+        periods: list[str] = [course(rng) if p in taught else "" for p in range(1, 5)]
+        rows.append([f"teacher{n:04d}", periods[0], periods[1], "Lunch", periods[2], periods[3]])
+    return rows
+
+
+def generate_absences(
+    teacher_ids: list[int], days: list[str], rate: float, rng: random.Random
+) -> dict[str, list[list]]:
+    """For each day, a get_absences_from_db style row for every absent teacher. An absent
+    teacher is away all day half the time and for one to three periods otherwise."""
+    absences: dict[str, list[list]] = {}
+    for day in days:
+        rows: list[list] = []
+        for teacher_id in teacher_ids:
+            if rng.random() >= rate:
+                continue
+            if rng.random() < 0.5:
+                periods: list[bool] = [True] * 4
+            else:
+                away: set[int] = set(rng.sample(range(4), rng.randint(1, 3)))
+                periods = [p in away for p in range(4)]
+            rows.append([teacher_id, f"teacher{teacher_id:04d}", *periods, all(periods)])
+        absences[day] = rows
+    return absences
+
+
+def generate_history(
+    teacher_ids: list[int], days: dict[str, list[str]], per_day: int, rng: random.Random
+) -> list[list]:
+    """About per_day on-calls for every day of every past school year."""
+    history: list[list] = []
+    for year, year_days in days.items():
+        for day in year_days:
+            for _ in range(rng.randint(per_day // 2, per_day * 3 // 2)):
+                absent, teacher = rng.sample(teacher_ids, 2)
+                period: str = f"period{rng.randint(1, 4)}"
+                history.append([absent, teacher, year, day, period, rng.choice(HALVES)])
+    return history
+
+
+def generate_school(
+    teachers: int = 120,
+    part_time: float = 0.15,
+    absence_rate: float = 0.05,
+    history_years: int = 2,
+    start_year: int = 2022,
+    seed: int = 0,
+) -> School:
+    """Generate a school. Teacher ids are assumed to follow timetable order from 1, as they
+    do when the timetable is imported into an empty database."""
+    rng = random.Random(seed)
+    timetable: list[list[str]] = generate_timetable(teachers, part_time, rng)
+    teacher_ids: list[int] = list(range(1, teachers + 1))
+    days: dict[str, list[str]] = {
+        f"{year}/{year + 1}": school_days(year)
+        for year in range(start_year, start_year + history_years + 1)
+    }
+    *past, current = days
+    per_day: int = max(2, round(teachers * absence_rate * 5))
+    history: list[list] = generate_history(
+        teacher_ids, {year: days[year] for year in past}, per_day, rng
+    )
+    absences = generate_absences(teacher_ids, days[current], absence_rate, rng)
+    return School(timetable, days, absences, history)
+
+
+def write_timetable(school: School, path: str, sheets: int = 1) -> str:
+    """Write the timetable as .csv or, for an .xlsx path, as a workbook split over sheets
+    (one per campus). Writing xlsx needs the xlsxwriter package. Returns the path."""
+    if path.endswith(".csv"):
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(TIMETABLE_HEADER)
+            writer.writerows(school.timetable)
+        return path
+    import xlsxwriter
+
+    workbook = xlsxwriter.Workbook(path)
+    size: int = -(-len(school.timetable) // sheets)
+    for sheet in range(sheets):
+        worksheet = workbook.add_worksheet(f"Campus {sheet + 1}")
+        worksheet.write_row(0, 0, TIMETABLE_HEADER)
+        for row, values in enumerate(school.timetable[sheet * size:(sheet + 1) * size], start=1):
+            worksheet.write_row(row, 0, values)
+    workbook.close()
+    return path
+
+
+def load_school(school: School, timetable_path: str) -> None:
+    """Fill the current database: import the timetable, then store the absences and the
+    on-call history."""
+    logic.import_schedule_streaming(timetable_path)
+    with db_config.Transaction():
+        for day, rows in school.absences.items():
+            logic.save_absences_to_db(day, rows)
+        logic.insert_oncalls(school.history)
+        logic.bump_generation("oncall_schedule")
@@ -1,15 +1,34 @@
+from oncall import startup
+
+# start timing before the other imports so the report covers them
+if startup.profiling_requested():
+    startup.start_profiling()
+
 import oncall.logic as logic
 import oncall.db_config as db_config
+from oncall import profiling
 import wx
-import wx.grid as grid
 from datetime import datetime
-from oncall.helper_classes import CustomGridTable, OnCallSchedule, Teacher
+from oncall.helper_classes import OnCallSchedule
+from oncall.tasks import TaskExecutor
+from typing import TYPE_CHECKING
+
+# the grid is only needed once a data window is opened
+grid = startup.lazy_import("wx.grid")
+gui = startup.lazy_import("oncall.gui")
+
+if TYPE_CHECKING:
+    import polars as pl
 
 
 class MyApp(wx.App):
     def __init__(self):
         super().__init__(clearSigInt=True)
+        # names the settings file wx.Config keeps the on-call limits in
+        self.SetAppName("OnCall")
         db_config.initializeDB()
+        # database, import and scheduling work runs here; callbacks come back on this thread
+        self.executor = TaskExecutor(dispatch=wx.CallAfter)
 
         self.InitFrame()
 
@@ -22,11 +41,16 @@ class MyApp(wx.App):
         self.frame.Show()
         self.frame.Center()
         self.frame.Bind(wx.EVT_CLOSE, self.OnClose)
+        startup.mark("main window shown")
+        # report once the event loop has drawn the window
+        wx.CallAfter(startup.finish_profiling)
 
     def OnClose(self, event) -> None:
         """Handle the close event."""
         if self.frame:
             self.frame.Destroy()
+        self.executor.shutdown(cancel=True)
+        db_config.close_all_pools()
         self.ExitMainLoop()
 
 
@@ -34,14 +58,79 @@ class MainFrame(wx.Frame):
     def __init__(self, parent, title, pos):
         super().__init__(parent=parent, title=title, pos=pos)
         self.SetSize(wx.Size(800, 600))  
+        self.init_menu()
         self.show_main_view()
 
+    def init_menu(self):
+        tools = wx.Menu()
+        limits = tools.Append(wx.ID_ANY, "On-call &limits...")
+        self.Bind(wx.EVT_MENU, self.edit_limits, limits)
+        query_stats = tools.Append(wx.ID_ANY, "&Query statistics...")
+        self.Bind(wx.EVT_MENU, self.show_query_stats, query_stats)
+        self.profiling = tools.AppendCheckItem(wx.ID_ANY, "&Profiling")
+        self.profiling.Check(profiling.is_enabled())
+        self.Bind(wx.EVT_MENU, self.toggle_profiling, self.profiling)
+        menu_bar = wx.MenuBar()
+        menu_bar.Append(tools, "&Tools")
+        self.SetMenuBar(menu_bar)
+
+    def edit_limits(self, event):
+        with LimitsDialog(self, *get_oncall_limits()) as dialog:
+            if dialog.ShowModal() == wx.ID_OK:
+                set_oncall_limits(*dialog.get_limits())
+
+    def show_query_stats(self, event):
+        import wx.lib.dialogs
+
+        dialog = wx.lib.dialogs.ScrolledMessageDialog(
+            self, db_config.query_stats.summary(), "Query statistics", size=(900, 500)
+        )
+        dialog.ShowModal()
+        dialog.Destroy()
+
+    def toggle_profiling(self, event):
+        """Start recording the phases of imports and scheduling; when stopped, show where
+        the time went and offer to save a Chrome trace."""
+        if self.profiling.IsChecked():
+            profiling.enable()
+            return
+        profiler = profiling.disable()
+        if profiler is None:
+            return
+        import io
+        import wx.lib.dialogs
+
+        report = io.StringIO()
+        profiler.report(report)
+        dialog = wx.lib.dialogs.ScrolledMessageDialog(
+            self, report.getvalue(), "Profiling", size=(900, 500)
+        )
+        dialog.ShowModal()
+        dialog.Destroy()
+        with wx.FileDialog(
+            self,
+            "Save Chrome trace",
+            defaultFile="oncall-trace.json",
+            wildcard="Trace files (*.json)|*.json",
+            style=wx.FD_SAVE | wx.FD_OVERWRITE_PROMPT,
+        ) as file_dialog:
+            if file_dialog.ShowModal() == wx.ID_OK:
+                profiler.write_chrome_trace(file_dialog.GetPath())
+
     def show_main_view(self):
         self.panel = MainPanel(self)
         self.panel.Layout()
 
     def show_data_view(self):
-        data = logic.get_absences_from_db(datetime.today().strftime("%Y%m%d"))
+        BackgroundTask(
+            self,
+            "Loading absences...",
+            logic.get_absences_from_db,
+            datetime.today().strftime("%Y%m%d"),
+            on_success=self.on_absences_loaded,
+        )
+
+    def on_absences_loaded(self, data):
         if not data:
             wx.MessageBox(
                 "No data found in the database.", "Error", wx.OK | wx.ICON_ERROR
@@ -96,7 +185,7 @@ class MainPanel(wx.Panel):
         with wx.FileDialog(
             self,
             "Open schedule file",
-            wildcard="xlsx files (*.xlsx)|*.xlsx",
+            wildcard="Timetables (*.xlsx;*.xls;*.csv)|*.xlsx;*.xls;*.csv",
             style=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST,
         ) as fileDialog:
             if fileDialog.ShowModal() == wx.ID_CANCEL:
@@ -104,23 +193,43 @@ class MainPanel(wx.Panel):
 
             # Proceed loading the file chosen by the user
             pathname: str = fileDialog.GetPath()
-            try:
-                #TODO: load scheudle now returns a dict of Teacher lists. Need another function to handle these into the DB
-                results: dict[str, list[Teacher]] = logic.load_schedule_from_file(pathname)
-                logic.handle_new_teachers(results["new_teachers"])
-                logic.handle_updated_teachers(results["updated_teachers"])
-                logic.handle_inactive_teachers(results["inactive_teachers"])
-                wx.MessageBox(f"New Teachers {results['new_teachers']}\
-                              \n Updated Teachs: {results['updated_teachers']}\
-                              \n inactive Teachers: {results['inactive_teachers']}")
-            except IOError:
+
+        def on_error(error: Exception) -> None:
+            if isinstance(error, IOError):
                 wx.LogError("Cannot open file '%s'." % pathname)
-                return
-            
+            else:
+                show_error(error)
+
+        BackgroundTask(
+            self,
+            "Reading timetable...",
+            logic.load_schedule_from_file,
+            pathname,
+            on_success=self.confirm_import,
+            on_error=on_error,
+        )
+
+    def confirm_import(self, results: "dict[str, pl.DataFrame]") -> None:
+        # show what would change and only write once the user agrees
+        answer = wx.MessageBox(
+            f"{logic.summarize_import(results)}\n\nApply these changes?",
+            "Load Schedule",
+            wx.YES_NO | wx.ICON_QUESTION,
+        )
+        if answer != wx.YES:
+            return
+        BackgroundTask(self, "Saving teachers...", logic.apply_schedule_import, results)
 
     def on_show_teacher_list(self, event):
         """Show the teacher list."""
-        teacher_list = logic.load_teacher_list_from_db()
+        BackgroundTask(
+            self,
+            "Loading teachers...",
+            logic.load_teacher_list_from_db,
+            on_success=self.show_teacher_list,
+        )
+
+    def show_teacher_list(self, teacher_list) -> None:
         teacher_names = [teacher.name for teacher in teacher_list.get_teachers()]
         wx.MessageBox(
             "\n".join(teacher_names), "Teacher List", wx.OK | wx.ICON_INFORMATION
@@ -128,7 +237,15 @@ class MainPanel(wx.Panel):
 
     def on_enter_unfilled_absences(self, event):
         """Enter unfilled absences for teachers."""
-        data = logic.get_absences_from_db(datetime.today().strftime("%Y%m%d"))
+        BackgroundTask(
+            self,
+            "Loading absences...",
+            logic.get_absences_from_db,
+            datetime.today().strftime("%Y%m%d"),
+            on_success=self.show_absences,
+        )
+
+    def show_absences(self, data) -> None:
         if not data:
             wx.MessageBox(
                 "No data found in the database.", "Error", wx.OK | wx.ICON_ERROR
@@ -138,7 +255,17 @@ class MainPanel(wx.Panel):
         data_window.Show()
 
     def schedule_oncalls(self, event):
-        oncall_window = OnCallWindow(self)
+        BackgroundTask(
+            self,
+            "Scheduling on-calls...",
+            plan_oncalls,
+            datetime.today().strftime("%Y%m%d"),
+            *get_oncall_limits(),
+            on_success=self.show_oncalls,
+        )
+
+    def show_oncalls(self, plan) -> None:
+        oncall_window = OnCallWindow(self, plan)
         oncall_window.Show()
 
 
@@ -160,7 +287,8 @@ class DataViewPanel(wx.Panel):
         """Build the dataview table and columns to display"""
         sizer = wx.BoxSizer(wx.VERTICAL)
         self.data_grid = grid.Grid(self)
-        self.table = CustomGridTable(data)
+        # editors, renderers and row colours come from the table's shared attrs
+        self.table = gui.CustomGridTable(data, striped=True)
         self.data_grid.SetTable(self.table, takeOwnership=True)
         self.data_grid.DisableDragRowSize()
         self.data_grid.DisableDragColSize()
@@ -173,25 +301,7 @@ class DataViewPanel(wx.Panel):
         for col in range(2, 7):
             self.data_grid.SetColSize(col, 60)
             self.data_grid.SetColFormatBool(col)
-            for row in range(0, len(data)):
-                self.data_grid.SetCellEditor(row, col, grid.GridCellBoolEditor())
-                self.data_grid.SetCellRenderer(row, col, grid.GridCellBoolRenderer())
-                self.data_grid.SetCellAlignment(
-                    row, col, wx.ALIGN_CENTER_HORIZONTAL, wx.ALIGN_CENTER_VERTICAL
-                )
-
-        for row in range(self.data_grid.GetNumberRows()):
-            color = (
-                wx.SystemSettings.GetColour(wx.SYS_COLOUR_WINDOW)
-                if row % 2 == 0
-                else darken_colour(
-                    wx.SystemSettings.GetColour(wx.SYS_COLOUR_WINDOW), 0.8
-                )
-            )
-            for col in range(self.data_grid.GetNumberCols()):
-                self.data_grid.SetCellBackgroundColour(row, col, color)
-                # Bind click event
-                self.data_grid.Bind(grid.EVT_GRID_CELL_LEFT_CLICK, self.on_cell_click)
+        self.data_grid.Bind(grid.EVT_GRID_CELL_LEFT_CLICK, self.on_cell_click)
 
         # Save / Cancel buttons
         btn_sizer = wx.BoxSizer(wx.HORIZONTAL)
@@ -211,14 +321,18 @@ class DataViewPanel(wx.Panel):
         self.GetParent().Close()
 
     def save(self, event):
-        response = logic.save_absences_to_db(
-            datetime.today().strftime("%Y%m%d"), self.table.data
-        )
-        message = (
-            "Absences saved sucessfully!"
-            if not response
-            else "Saving failed... Try Again"
+        # only teachers whose row was changed are written
+        BackgroundTask(
+            self,
+            "Saving absences...",
+            logic.save_absence_changes,
+            datetime.today().strftime("%Y%m%d"),
+            self.table.get_dirty_rows(),
+            on_success=lambda response: self.saved("Absences saved sucessfully!"),
+            on_error=lambda error: self.saved("Saving failed... Try Again"),
         )
+
+    def saved(self, message: str) -> None:
         dialog = wx.MessageDialog(self, message)
         dialog.ShowModal()
         self.cancel(event=None)
@@ -231,39 +345,36 @@ class DataViewPanel(wx.Panel):
             # Toggle value
             if col == 6:
                 # Toggle all toggle columns in this row
-                for toggle_col in range(2, 7):
-                    self.table.SetValue(row, toggle_col, new_val)  # type: ignore - SetValue needs to be a bool for clicking to work
+                first_col = 2
+                self.table.set_row_values(row, range(2, 7), new_val)
             else:
                 # Just toggle the clicked column
+                first_col = col
                 self.table.SetValue(row, col, new_val)  # type: ignore - SetValue needs to be a bool for clicking to work
-            self.data_grid.ForceRefresh()  # Repaint the grid
+            # repaint only the cells that changed
+            self.data_grid.RefreshBlock(row, first_col, row, col)
         else:
             event.Skip()  # Let normal click behavior proceed
 
 
 class OnCallWindow(wx.Frame):
-    def __init__(self, parent):
+    def __init__(self, parent, plan):
         super().__init__(parent, title="Schedule On Calls", size=wx.Size(700, 500))
-        panel = OnCallPanel(self)
+        panel = OnCallPanel(self, plan)
         self.Center()
         panel.AutoLayout
 
 
 class OnCallPanel(wx.Panel):
-    def __init__(self, parent):
+    def __init__(self, parent, plan):
         super().__init__(parent)
         self.parent = parent
-        self.init_ui()
-
-    def init_ui(self):
-        date = datetime.today().strftime("%Y%m%d")
-        self.schedule = OnCallSchedule(date)
-        self.schedule.schedule_oncalls()
-        lookup = logic.get_teacher_lookup()
-        data = logic.add_names(self.schedule.get_schedule(), lookup)
-        print(data)
+        self.init_ui(plan)
+
+    def init_ui(self, plan):
+        self.schedule, self.added, self.removed, data = plan
         data_grid = grid.Grid(self)
-        table = CustomGridTable(data)
+        table = gui.CustomGridTable(data)
         data_grid.SetTable(table, takeOwnership=True)
 
         ok_button = wx.Button(self, label="OK")
@@ -274,19 +385,130 @@ class OnCallPanel(wx.Panel):
         self.SetSizer(sizer)
     
     def save_schedule(self, event):
-        logic.save_oncall_schedule(self.schedule.get_schedule())
-        self.parent.Close()    
+        BackgroundTask(
+            self,
+            "Saving on-calls...",
+            logic.save_oncall_changes,
+            self.added,
+            self.removed,
+            on_success=lambda result: self.parent.Close(),
+        )
+
+
+def plan_oncalls(date: str, max_per_week: int | None = None, max_per_year: int | None = None) -> tuple:
+    """Schedule the date without saving, for the on-call window. Runs on a worker thread.
+
+    Returns the schedule, the added and removed rows, and the schedule with names."""
+    snapshot = logic.load_day_snapshot(date)
+    schedule = OnCallSchedule.from_snapshot(snapshot, max_per_week, max_per_year)
+    # keep any on-calls already announced today and only fill what changed
+    added, removed = schedule.reschedule()
+    data = logic.add_names(schedule.get_schedule(), snapshot.lookup)
+    return schedule, added, removed, data
+
+
+def get_oncall_limits() -> tuple[int | None, int | None]:
+    """The most on-calls a teacher may take per week and per year, None meaning no limit,
+    as saved in the app's settings. Call on the main thread."""
+    config = wx.Config.Get()
+    return config.ReadInt("MaxPerWeek", 0) or None, config.ReadInt("MaxPerYear", 0) or None
+
+
+def set_oncall_limits(max_per_week: int | None, max_per_year: int | None) -> None:
+    config = wx.Config.Get()
+    config.WriteInt("MaxPerWeek", max_per_week or 0)
+    config.WriteInt("MaxPerYear", max_per_year or 0)
+    config.Flush()
+
+
+class LimitsDialog(wx.Dialog):
+    """Edits the weekly and yearly on-call limits; 0 means no limit."""
+
+    def __init__(self, parent, max_per_week: int | None, max_per_year: int | None):
+        super().__init__(parent, title="On-call limits")
+        self.max_per_week = wx.SpinCtrl(self, min=0, max=100, initial=max_per_week or 0)
+        self.max_per_year = wx.SpinCtrl(self, min=0, max=1000, initial=max_per_year or 0)
+        grid_sizer = wx.FlexGridSizer(cols=2, vgap=5, hgap=10)
+        grid_sizer.Add(wx.StaticText(self, label="Most on-calls per week"), flag=wx.ALIGN_CENTER_VERTICAL)
+        grid_sizer.Add(self.max_per_week)
+        grid_sizer.Add(wx.StaticText(self, label="Most on-calls per year"), flag=wx.ALIGN_CENTER_VERTICAL)
+        grid_sizer.Add(self.max_per_year)
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(grid_sizer, flag=wx.ALL, border=10)
+        sizer.Add(wx.StaticText(self, label="0 means no limit"), flag=wx.LEFT | wx.RIGHT, border=10)
+        sizer.Add(self.CreateStdDialogButtonSizer(wx.OK | wx.CANCEL), flag=wx.EXPAND | wx.ALL, border=10)
+        self.SetSizerAndFit(sizer)
+
+    def get_limits(self) -> tuple[int | None, int | None]:
+        return self.max_per_week.GetValue() or None, self.max_per_year.GetValue() or None
+
+
+def show_error(error: Exception) -> None:
+    wx.MessageBox(str(error), "Error", wx.OK | wx.ICON_ERROR)
+
+
+class BackgroundTask:
+    """Runs a function on the app's executor behind a progress dialog.
+
+    The dialog keeps the window responsive while the work runs, shows the progress the task
+    reports (or pulses when it reports none) and cancels the task if Cancel is pressed.
+    on_success and on_error are called on the main thread once the dialog is closed; errors
+    without an on_error are shown in a message box."""
+
+    def __init__(self, parent, message: str, func, *args, on_success=None, on_error=None):
+        self.message = message
+        self.progress: int | None = None
+        self.on_success = on_success
+        self.on_error = on_error or show_error
+        self.dialog = wx.ProgressDialog(
+            "Please wait",
+            message,
+            maximum=100,
+            parent=parent,
+            style=wx.PD_APP_MODAL | wx.PD_CAN_ABORT | wx.PD_ELAPSED_TIME,
+        )
+        self.timer = wx.Timer()
+        self.timer.Bind(wx.EVT_TIMER, self.on_timer)
+        self.timer.Start(100)
+        self.task = wx.GetApp().executor.submit(
+            func,
+            *args,
+            on_success=self.succeeded,
+            on_error=self.failed,
+            on_progress=self.on_progress,
+            on_cancelled=self.close,
+        )
+
+    def on_progress(self, done: int, total: int | None, message: str) -> None:
+        self.progress = min(100, done * 100 // total) if total else None
+        if message:
+            self.message = message
+
+    def on_timer(self, event) -> None:
+        if self.progress is None:
+            keep_going, _ = self.dialog.Pulse(self.message)
+        else:
+            keep_going, _ = self.dialog.Update(self.progress, self.message)
+        if not keep_going:
+            self.task.cancel()
+
+    def close(self) -> None:
+        self.timer.Stop()
+        self.dialog.Destroy()
 
+    def succeeded(self, result) -> None:
+        self.close()
+        # Cancel may be pressed after the task finished but before this call came through
+        if self.on_success and not self.task.cancelled:
+            self.on_success(result)
 
-def darken_colour(colour, factor=0.9):
-    """Return a darker version of the given wx.Colour."""
-    r = int(colour.Red() * factor)
-    g = int(colour.Green() * factor)
-    b = int(colour.Blue() * factor)
-    return wx.Colour(r, g, b)
+    def failed(self, error: Exception) -> None:
+        self.close()
+        self.on_error(error)
 
 
 if __name__ == "__main__":
+    db_config.configure_logging()
     app = MyApp()
     app.MainLoop()
 
@@ -6,7 +6,8 @@ a = Analysis(
     pathex=[],
     binaries=[],
     datas=[],
-    hiddenimports=['polars', 'fastexcel'],
+    # loaded with oncall.startup.lazy_import, which PyInstaller cannot follow
+    hiddenimports=['polars', 'fastexcel', 'wx.grid', 'oncall.gui'],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
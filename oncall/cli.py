@@ -0,0 +1,229 @@
+"""Command line entry point for running the scheduler without the GUI.
+
+    python -m oncall [--db FILE] import TIMETABLE [--batch-size N] [--dry-run]
+    python -m oncall [--db FILE] absences CSV [--date YYYYMMDD] [--replace]
+    python -m oncall [--db FILE] schedule [--date YYYYMMDD | --start YYYYMMDD --end YYYYMMDD]
+                     [--max-per-week N] [--max-per-year N] [--dry-run]
+    python -m oncall [--db FILE] export [--date YYYYMMDD | --start YYYYMMDD --end YYYYMMDD] [-o FILE]
+
+Options before the command: --query-stats prints SQL timings, --profile prints the time
+spent in each phase and --trace FILE writes the phases as a Chrome trace.
+
+Nothing here imports wx, so it runs on a headless server (e.g. from cron).
+"""
+import argparse
+import csv
+import sys
+from datetime import datetime
+from typing import Iterable, TextIO
+
+from oncall import db_config, logic, profiling
+from oncall.helper_classes import OnCallRangeSchedule, OnCallSchedule
+
+TRUE_VALUES: frozenset[str] = frozenset({"1", "x", "y", "yes", "true", "t"})
+
+
+def parse_date(value: str) -> str:
+    """argparse type for dates: accepts YYYYMMDD or YYYY-MM-DD and returns YYYYMMDD."""
+    for fmt in ("%Y%m%d", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y%m%d")
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(f"invalid date {value!r}, expected YYYYMMDD")
+
+
+def today() -> str:
+    return datetime.today().strftime("%Y%m%d")
+
+
+def date_bounds(args: argparse.Namespace) -> tuple[str, str]:
+    """Return the (start, end) days selected by --date or --start/--end."""
+    if args.start or args.end:
+        if not (args.start and args.end):
+            raise ValueError("--start and --end must be given together")
+        if args.start > args.end:
+            raise ValueError("--start must not be after --end")
+        return args.start, args.end
+    day: str = args.date or today()
+    return day, day
+
+
+def read_absences_csv(file: TextIO, default_date: str | None = None) -> dict[str, list]:
+    """Read absences from a CSV with a teacher column (name or id), period1-period4 columns
+    and an optional date column, grouped by date in the rows save_absences_to_db expects."""
+    lookup: dict[int, str] = logic.get_teacher_lookup()
+    ids_by_name: dict[str, int] = {name: teacher_id for teacher_id, name in lookup.items()}
+    absences: dict[str, list] = {}
+    for line, row in enumerate(csv.DictReader(file), start=2):
+        teacher: str = (row.get("teacher") or "").strip()
+        if teacher.isdigit() and int(teacher) in lookup:
+            teacher_id: int = int(teacher)
+        elif teacher in ids_by_name:
+            teacher_id = ids_by_name[teacher]
+        else:
+            raise ValueError(f"line {line}: unknown teacher {teacher!r}")
+        date: str | None = (row.get("date") or "").strip() or default_date
+        if date is None:
+            raise ValueError(f"line {line}: no date given and no --date option")
+        date = parse_date(date)
+        periods: list[bool] = [
+            (row.get(f"period{period}") or "").strip().lower() in TRUE_VALUES
+            for period in range(1, 5)
+        ]
+        absences.setdefault(date, []).append(
+            [teacher_id, lookup[teacher_id], *periods, all(periods)]
+        )
+    return absences
+
+
+def write_schedule_csv(rows: Iterable[list], file: TextIO) -> None:
+    """Write on-call rows in get_oncall_schedule format as CSV with teacher names."""
+    lookup: dict[int, str] = logic.get_teacher_lookup()
+    writer = csv.writer(file)
+    writer.writerow(["date", "period", "half", "absent_teacher", "oncall_teacher", "year"])
+    for absent_teacher_id, teacher_id, year, date, period, half in rows:
+        writer.writerow(
+            [date, period, half, lookup.get(absent_teacher_id, ""), lookup.get(teacher_id, ""), year]
+        )
+
+
+def cmd_import(args: argparse.Namespace) -> int:
+    counts: dict[str, int] = logic.import_schedule_streaming(
+        args.file, batch_size=args.batch_size, dry_run=args.dry_run
+    )
+    prefix: str = "Would import" if args.dry_run else "Imported"
+    print(
+        f"{prefix}: {counts['new_teachers']} new, {counts['updated_teachers']} updated, "
+        f"{counts['inactive_teachers']} deactivated, {counts['unchanged_teachers']} unchanged"
+    )
+    return 0
+
+
+def cmd_absences(args: argparse.Namespace) -> int:
+    with open(args.file, newline="", encoding="utf-8-sig") as file:
+        absences: dict[str, list] = read_absences_csv(file, args.date)
+    # only the teachers in the file change, unless --replace makes it the whole day's list
+    save = logic.save_absences_to_db if args.replace else logic.save_absence_changes
+    with db_config.Transaction():
+        for date, rows in sorted(absences.items()):
+            save(date, rows)
+    for date, rows in sorted(absences.items()):
+        saved: int = sum(1 for row in rows if any(row[2:6]))
+        cleared: str = f", cleared {len(rows) - saved}" if saved < len(rows) else ""
+        print(f"{date}: saved {saved} absences{cleared}")
+    return 0
+
+
+def cmd_schedule(args: argparse.Namespace) -> int:
+    start, end = date_bounds(args)
+    if start == end:
+        schedule = OnCallSchedule.from_snapshot(
+            logic.load_day_snapshot(start), args.max_per_week, args.max_per_year
+        )
+        added, removed = schedule.reschedule()
+        if not args.dry_run:
+            logic.save_oncall_changes(added, removed)
+        print(f"{start}: {len(added)} on-calls added, {len(removed)} removed")
+        uncovered: int = len(schedule.uncovered)
+    else:
+        schedule = OnCallRangeSchedule(start, end, args.max_per_week, args.max_per_year)
+        schedule.schedule_oncalls()
+        if not args.dry_run:
+            schedule.save()
+        print(f"{start}-{end}: {len(schedule.get_schedule())} on-calls scheduled")
+        uncovered = sum(len(day.uncovered) for day in schedule.schedules.values())
+    if uncovered:
+        print(f"{uncovered} slots could not be covered", file=sys.stderr)
+    return 0
+
+
+def cmd_export(args: argparse.Namespace) -> int:
+    start, end = date_bounds(args)
+    rows: list = logic.get_oncall_schedule_between(start, end)
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as file:
+            write_schedule_csv(rows, file)
+    else:
+        write_schedule_csv(rows, sys.stdout)
+    return 0
+
+
+def add_date_options(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--date", type=parse_date, help="a single day (default: today)")
+    parser.add_argument("--start", type=parse_date, help="first day of a range")
+    parser.add_argument("--end", type=parse_date, help="last day of a range")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m oncall", description="On-call scheduler")
+    parser.add_argument("--db", default=None, help="database file (default: oncall.db)")
+    parser.add_argument(
+        "--query-stats", action="store_true", help="print SQL timings and slow queries to stderr"
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="print where the time went by phase to stderr"
+    )
+    parser.add_argument("--trace", metavar="FILE", help="write a Chrome trace of the phases to FILE")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = commands.add_parser("import", help="import a timetable (xlsx, xls or csv)")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--batch-size", type=int, default=logic.IMPORT_BATCH_SIZE)
+    import_parser.add_argument("--dry-run", action="store_true", help="report without writing")
+    import_parser.set_defaults(func=cmd_import)
+
+    absences_parser = commands.add_parser("absences", help="enter absences from a CSV")
+    absences_parser.add_argument("file")
+    absences_parser.add_argument(
+        "--date", type=parse_date, help="date for rows without a date column"
+    )
+    absences_parser.add_argument(
+        "--replace",
+        action="store_true",
+        help="replace each date's absences with the file's instead of updating only its teachers",
+    )
+    absences_parser.set_defaults(func=cmd_absences)
+
+    schedule_parser = commands.add_parser("schedule", help="schedule on-calls for a day or range")
+    add_date_options(schedule_parser)
+    schedule_parser.add_argument(
+        "--max-per-week", type=int, default=None, help="most on-calls a teacher may take in a week"
+    )
+    schedule_parser.add_argument(
+        "--max-per-year", type=int, default=None, help="most on-calls a teacher may take in a school year"
+    )
+    schedule_parser.add_argument("--dry-run", action="store_true", help="report without saving")
+    schedule_parser.set_defaults(func=cmd_schedule)
+
+    export_parser = commands.add_parser("export", help="export the saved schedule as CSV")
+    add_date_options(export_parser)
+    export_parser.add_argument("-o", "--output", help="file to write (default: stdout)")
+    export_parser.set_defaults(func=cmd_export)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    db_config.configure_logging()
+    if args.db:
+        db_config.set_database_path(args.db)
+        logic.clear_cache()
+    if args.profile or args.trace:
+        profiling.enable()
+    try:
+        db_config.initializeDB()
+        return args.func(args)
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if args.query_stats:
+            print(db_config.query_stats.summary(), file=sys.stderr)
+        profiler = profiling.disable() if args.profile or args.trace else None
+        if profiler and args.profile:
+            profiler.report()
+        if profiler and args.trace:
+            profiler.write_chrome_trace(args.trace)
+        db_config.close_all_pools()
@@ -1,5 +1,15 @@
+import logging
+import os
 import sqlite3
-import pathlib
+import sys
+import threading
+import time
+from collections import deque
+from typing import Callable, NamedTuple
+
+from oncall import profiling
+
+logger = logging.getLogger("oncall.db")
 
 class Result:
     """A class to represent the result of a database operation."""
@@ -9,42 +19,402 @@ class Result:
         self.data = data if data is not None else []
 
 
+class ConnectionPool:
+    """Hands out one long-lived connection per thread for a single database file.
+
+    sqlite3 connections may not be shared across threads, so each thread gets its own
+    connection the first time it asks and keeps reusing it. The pragmas are applied once
+    when the connection is opened rather than on every query.
+    """
+    def __init__(
+        self,
+        db_path: str | None = None,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+        cached_statements: int = 128,
+        timeout: float = 5.0,
+    ):
+        self.db_path = resolve_db_path(db_path)
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: list[sqlite3.Connection] = []
+        self._external_changes: int = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection and apply the configured pragmas."""
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.timeout,
+            cached_statements=self.cached_statements,
+        )
+        if self.journal_mode:
+            conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        if self.synchronous:
+            conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        return conn
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Return the connection owned by the calling thread, opening it if needed."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close_all(self) -> None:
+        """Close every connection the pool has handed out."""
+        with self._lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.ProgrammingError:
+                    # the connection belongs to another thread; it is released when that thread ends
+                    pass
+            self._connections.clear()
+        self._local = threading.local()
+
+    @property
+    def transaction_depth(self) -> int:
+        """How many Transaction blocks the calling thread currently has open."""
+        return getattr(self._local, "depth", 0)
+
+    @transaction_depth.setter
+    def transaction_depth(self, value: int) -> None:
+        self._local.depth = value
+
+    def in_transaction(self) -> bool:
+        """True while the calling thread is inside a Transaction block."""
+        return self.transaction_depth > 0
+
+    def after_commit(self, callback: Callable[[], None]) -> None:
+        """Call callback once the calling thread's open Transaction commits. Dropped if it
+        rolls back."""
+        self._local.__dict__.setdefault("after_commit", []).append(callback)
+
+    def pop_after_commit(self) -> list[Callable[[], None]]:
+        """Remove and return the callbacks waiting on the calling thread's Transaction."""
+        return self._local.__dict__.pop("after_commit", [])
+
+    def external_changes(self) -> int:
+        """A counter, shared by every thread, that moves on whenever any of the pool's
+        connections sees a commit made by another connection.
+
+        SQLite's data_version is only comparable on the connection that read it, so each
+        thread compares it with its own previous value and bumps the shared counter on a
+        change. A connection seen for the first time also bumps it, as it cannot tell
+        what was committed before it opened."""
+        conn = self.get_connection()
+        version: int = conn.execute("PRAGMA data_version").fetchone()[0]
+        if getattr(self._local, "data_version", None) != version:
+            self._local.data_version = version
+            with self._lock:
+                self._external_changes += 1
+        return self._external_changes
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+DEFAULT_DB_PATH = "oncall.db"
+
+
+def set_database_path(db_path: str) -> None:
+    """Point every call that does not name a database file at db_path instead of oncall.db."""
+    global DEFAULT_DB_PATH
+    DEFAULT_DB_PATH = str(db_path)
+
+
+def resolve_db_path(db_path: str | None = None) -> str:
+    """Return db_path, or the current default database file when it is None."""
+    return DEFAULT_DB_PATH if db_path is None else str(db_path)
+
+
+def get_pool(db_path: str | None = None) -> ConnectionPool:
+    """Return the shared pool for the given database file, creating it on first use."""
+    db_path = resolve_db_path(db_path)
+    with _pools_lock:
+        pool = _pools.get(db_path)
+        if pool is None:
+            pool = ConnectionPool(db_path)
+            _pools[db_path] = pool
+        return pool
+
+
+def configure_pool(db_path: str | None = None, **settings) -> ConnectionPool:
+    """Replace the shared pool for a database file with one using the given settings.
+
+    Accepts the keyword arguments of ConnectionPool (journal_mode, synchronous,
+    cached_statements, timeout). Existing connections for that file are closed.
+    """
+    db_path = resolve_db_path(db_path)
+    with _pools_lock:
+        old = _pools.pop(db_path, None)
+        if old is not None:
+            old.close_all()
+        pool = ConnectionPool(db_path, **settings)
+        _pools[db_path] = pool
+        return pool
+
+
+def close_all_pools() -> None:
+    """Close the connections of every shared pool."""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close_all()
+        _pools.clear()
+
+
+def data_version(db_path: str | None = None) -> int:
+    """Return SQLite's data_version for this thread's connection; it changes whenever
+    another connection commits to the database. Only comparable on the same thread; see
+    external_changes for a value shared by every thread."""
+    return get_pool(db_path).get_connection().execute("PRAGMA data_version").fetchone()[0]
+
+
+def external_changes(db_path: str | None = None) -> int:
+    """Return the pool's count of commits seen from other connections; see
+    ConnectionPool.external_changes."""
+    return get_pool(db_path).external_changes()
+
+
 class DatabaseConnection:
     """A context manager for handling database connections."""
-    def __init__(self, db_path: str = "oncall.db"):
+    def __init__(self, db_path: str | None = None):
         self.db_path = db_path
         self.conn = None
         self.cursor = None
 
     def __enter__(self):
-        """Establish a database connection and return the connection and cursor."""
-        self.conn = sqlite3.connect(self.db_path)
+        """Borrow the pooled connection for this thread and return the connection and cursor."""
+        self.conn = get_pool(self.db_path).get_connection()
         self.cursor = self.conn.cursor()
         return self.conn, self.cursor
 
     def __exit__(self, exc_type, exc_value, traceback):    
-        """Close the database connection and handle exceptions."""   
+        """Commit or roll back and release the cursor; the connection stays open in the pool.
+
+        Inside a Transaction the commit is left to the outermost Transaction block.
+        """   
         if self.conn:     
-            if exc_type is not None:
-                self.conn.rollback()
-            else:
-                self.conn.commit()
+            if not get_pool(self.db_path).in_transaction():
+                if exc_type is not None:
+                    self.conn.rollback()
+                else:
+                    self.conn.commit()
             if self.cursor:
                 self.cursor.close()
-            self.conn.close()
         else:
             raise Exception("Database connection was not established.")
     
 
-def initializeDB() -> None:
-    """Initialize the SQLite database and create necessary tables."""
-    # Connect to the SQLite database (or create it if it doesn't exist)
-    if not pathlib.Path("oncall.db").exists():
-        # Create the database file
-        conn = sqlite3.connect("oncall.db")
-        cursor = conn.cursor()
-        # Create a table for teachers if it doesn't exist
-        cursor.execute("""
+class Transaction:
+    """A context manager that groups several queries into one atomic commit.
+
+    Every execute_query call made by the same thread inside the block runs on the same
+    pooled connection and is committed once when the outermost block exits, or rolled
+    back entirely if an exception escapes. Blocks may be nested; inner blocks join the
+    outer transaction. Pass immediate=False for a read-only block: the database is not
+    locked for writing, but every query still sees the same consistent view.
+    """
+    def __init__(self, db_path: str | None = None, immediate: bool = True):
+        self.db_path = db_path
+        self.immediate = immediate
+        self.pool = None
+        self.conn = None
+
+    def __enter__(self):
+        """Begin the transaction (or join the one already open) and return the connection."""
+        self.pool = get_pool(self.db_path)
+        self.conn = self.pool.get_connection()
+        if not self.pool.in_transaction():
+            if self.conn.in_transaction:
+                # flush anything left pending by a plain query so it isn't swept into this unit
+                self.conn.commit()
+            self.conn.execute("BEGIN IMMEDIATE" if self.immediate else "BEGIN")
+        self.pool.transaction_depth += 1
+        return self.conn
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Commit when the outermost block exits cleanly, otherwise roll back."""
+        self.pool.transaction_depth -= 1
+        if self.pool.transaction_depth == 0:
+            callbacks = self.pool.pop_after_commit()
+            if exc_type is not None:
+                self.conn.rollback()
+            else:
+                self.conn.commit()
+                for callback in callbacks:
+                    callback()
+
+
+class QueryStat(NamedTuple):
+    """Totals for one query from one call site."""
+    calls: int
+    total_ms: float
+    max_ms: float
+    rows: int
+    failures: int
+
+
+class SlowQuery(NamedTuple):
+    tag: str
+    query: str
+    elapsed_ms: float
+    rows: int
+    plan: list[str]
+
+
+class QueryStats:
+    """Records what execute_query ran: timings, row counts and failures per call site and
+    query, plus the slowest queries with their query plans.
+
+    Every query that takes at least slow_query_ms is logged, with its EXPLAIN QUERY PLAN,
+    as a warning on the oncall.db logger. The default threshold comes from the
+    ONCALL_SLOW_QUERY_MS environment variable (200 ms when unset); None turns the slow
+    query log off. summary() gives a report the GUI and command line can show.
+
+    Nothing here configures logging; the entry points (main.py and python -m oncall) call
+    configure_logging so the warnings reach stderr with a proper format."""
+
+    def __init__(self, enabled: bool = True, slow_query_ms: float | None = 200.0, keep_slow: int = 20):
+        self.enabled = enabled
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._stats: dict[tuple[str, str], QueryStat] = {}
+        self.slow: deque[SlowQuery] = deque(maxlen=keep_slow)
+
+    def record(
+        self,
+        tag: str,
+        query: str,
+        params: tuple | list[tuple],
+        elapsed: float,
+        rows: int,
+        failed: bool = False,
+        conn: sqlite3.Connection | None = None,
+    ) -> None:
+        elapsed_ms: float = elapsed * 1000
+        key: tuple[str, str] = (tag, query)
+        with self._lock:
+            stat: QueryStat = self._stats.get(key, QueryStat(0, 0.0, 0.0, 0, 0))
+            self._stats[key] = QueryStat(
+                stat.calls + 1,
+                stat.total_ms + elapsed_ms,
+                max(stat.max_ms, elapsed_ms),
+                stat.rows + rows,
+                stat.failures + failed,
+            )
+        if self.slow_query_ms is not None and elapsed_ms >= self.slow_query_ms and not failed:
+            plan: list[str] = explain_query_plan(conn, query, params) if conn else []
+            self.slow.append(SlowQuery(tag, query, elapsed_ms, rows, plan))
+            logger.warning(
+                "slow query (%.1f ms, %d rows) from %s: %s\n%s",
+                elapsed_ms,
+                rows,
+                tag,
+                " ".join(query.split()),
+                "\n".join(plan),
+            )
+
+    def get_stats(self) -> dict[tuple[str, str], QueryStat]:
+        """Totals keyed by (call site tag, query)."""
+        with self._lock:
+            return dict(self._stats)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+            self.slow.clear()
+
+    def summary(self, limit: int = 15) -> str:
+        """The queries that took the most time in total, then the slow query log."""
+        stats = sorted(self.get_stats().items(), key=lambda item: item[1].total_ms, reverse=True)
+        lines: list[str] = [
+            f"{sum(stat.calls for _, stat in stats)} queries, "
+            f"{sum(stat.total_ms for _, stat in stats):.1f} ms in total",
+            f"{'calls':>6} {'total ms':>9} {'max ms':>8} {'rows':>7}  call site: query",
+        ]
+        for (tag, query), stat in stats[:limit]:
+            failed: str = f" ({stat.failures} failed)" if stat.failures else ""
+            lines.append(
+                f"{stat.calls:6d} {stat.total_ms:9.1f} {stat.max_ms:8.1f} {stat.rows:7d}  "
+                f"{tag}: {' '.join(query.split())[:100]}{failed}"
+            )
+        if self.slow:
+            lines.append(f"slow queries (>= {self.slow_query_ms} ms):")
+            for slow in self.slow:
+                lines.append(f"{slow.elapsed_ms:9.1f} ms  {slow.tag}: {' '.join(slow.query.split())[:100]}")
+                lines.extend(f"             {step}" for step in slow.plan)
+        return "\n".join(lines)
+
+
+def explain_query_plan(conn: sqlite3.Connection, query: str, params: tuple | list[tuple] = ()) -> list[str]:
+    """Return SQLite's EXPLAIN QUERY PLAN for a query, one line per step."""
+    if isinstance(params, list):
+        params = params[0] if params else ()
+    try:
+        rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+    except sqlite3.Error:
+        return []
+    return [row[-1] for row in rows]
+
+
+DEFAULT_SLOW_QUERY_MS: float = 200.0
+
+
+def _slow_query_ms_from_env() -> float | None:
+    value: str = os.environ.get("ONCALL_SLOW_QUERY_MS", "").strip()
+    if value.lower() in ("off", "none"):
+        return None
+    if not value:
+        return DEFAULT_SLOW_QUERY_MS
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning(
+            "ignoring ONCALL_SLOW_QUERY_MS=%r, which is not a number; using %s ms",
+            value,
+            DEFAULT_SLOW_QUERY_MS,
+        )
+        return DEFAULT_SLOW_QUERY_MS
+
+
+query_stats = QueryStats(slow_query_ms=_slow_query_ms_from_env())
+
+
+def configure_logging(level: int = logging.WARNING) -> None:
+    """Send the app's log messages, such as the slow query log, to stderr. Does nothing if
+    the program has configured logging already."""
+    logging.basicConfig(level=level, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+
+def _call_site() -> str:
+    """module.function of whatever called execute_query."""
+    frame = sys._getframe(2)
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+
+def _week_start_sql(column: str) -> str:
+    """SQL giving the Sunday that starts the week of a YYYYMMDD date column, as YYYYMMDD."""
+    iso: str = f"substr({column}, 1, 4) || '-' || substr({column}, 5, 2) || '-' || substr({column}, 7, 2)"
+    return f"strftime('%Y%m%d', {iso}, '-' || strftime('%w', {iso}) || ' days')"
+
+
+# Ordered schema migrations as (version, description, statements). Each migration runs in
+# its own transaction and is recorded in schema_version, so a database only ever receives
+# the migrations it has not seen yet. Append new migrations; never edit applied ones.
+MIGRATIONS: list[tuple[int, str, list[str]]] = [
+    (
+        1,
+        "create base tables",
+        [
+            """
             CREATE TABLE IF NOT EXISTS teachers (
                 teacher_id INTEGER PRIMARY KEY,
                 teacher_name TEXT NOT NULL,
@@ -55,9 +425,8 @@ def initializeDB() -> None:
                 available INTEGER DEFAULT NULL,
                 active INTEGER DEFAULT 1
             )
-        """)
-        # Create a table for on-call schedules if it doesn't exist
-        cursor.execute("""
+            """,
+            """
             CREATE TABLE IF NOT EXISTS oncall_schedule (
                 id INTEGER PRIMARY KEY,
                 date TEXT NOT NULL,
@@ -67,9 +436,8 @@ def initializeDB() -> None:
                 half TEXT NOT NULL,
                 FOREIGN KEY (teacher_id) REFERENCES teachers (id)
             )
-        """)
-        # Create a table for unfilled absences if it doesn't exist;
-        cursor.execute("""
+            """,
+            """
             CREATE TABLE IF NOT EXISTS unfilled_absences (
                 id INTEGER PRIMARY KEY,
                 date TEXT NOT NULL,
@@ -80,27 +448,268 @@ def initializeDB() -> None:
                 period4 INTEGER,
                 FOREIGN KEY (teacher_id) REFERENCES teachers (id)
             )
+            """,
+        ],
+    ),
+    (
+        2,
+        "index the date, year and name lookups",
+        [
+            # per-date absence lookups read every column from the index
+            """
+            CREATE INDEX IF NOT EXISTS idx_unfilled_absences_date
+            ON unfilled_absences (date, teacher_id, period1, period2, period3, period4)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_oncall_schedule_date
+            ON oncall_schedule (date)
+            """,
+            # get_oncall_totals groups a year's rows by teacher without touching the table
+            """
+            CREATE INDEX IF NOT EXISTS idx_oncall_schedule_year_teacher
+            ON oncall_schedule (year, teacher_id)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_teachers_name
+            ON teachers (teacher_name)
+            """,
+        ],
+    ),
+    (
+        3,
+        "record which absence each on-call covers",
+        [
+            "ALTER TABLE oncall_schedule ADD COLUMN absent_teacher_id INTEGER",
+        ],
+    ),
+    (
+        4,
+        "keep per teacher weekly and yearly on-call counts",
+        [
+            # week_start is the Sunday starting the week, matching logic.current_week
+            """
+            CREATE TABLE IF NOT EXISTS oncall_counts (
+                teacher_id INTEGER NOT NULL,
+                year TEXT NOT NULL,
+                week_start TEXT NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (teacher_id, year, week_start)
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_oncall_counts_week
+            ON oncall_counts (week_start, teacher_id, count)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_oncall_counts_year
+            ON oncall_counts (year, teacher_id, count)
+            """,
+            f"""
+            INSERT INTO oncall_counts (teacher_id, year, week_start, count)
+            SELECT teacher_id, year, {_week_start_sql("date")}, COUNT(*)
+            FROM oncall_schedule
+            WHERE teacher_id IS NOT NULL
+            GROUP BY 1, 2, 3
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS oncall_counts_insert
+            AFTER INSERT ON oncall_schedule
+            WHEN NEW.teacher_id IS NOT NULL
+            BEGIN
+                INSERT INTO oncall_counts (teacher_id, year, week_start, count)
+                VALUES (NEW.teacher_id, NEW.year, {_week_start_sql("NEW.date")}, 1)
+                ON CONFLICT (teacher_id, year, week_start) DO UPDATE SET count = count + 1;
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS oncall_counts_delete
+            AFTER DELETE ON oncall_schedule
+            WHEN OLD.teacher_id IS NOT NULL
+            BEGIN
+                UPDATE oncall_counts SET count = count - 1
+                WHERE teacher_id = OLD.teacher_id
+                AND year = OLD.year
+                AND week_start = {_week_start_sql("OLD.date")};
+                DELETE FROM oncall_counts WHERE count <= 0;
+            END
+            """,
+            f"""
+            CREATE TRIGGER IF NOT EXISTS oncall_counts_update
+            AFTER UPDATE OF teacher_id, year, date ON oncall_schedule
+            BEGIN
+                UPDATE oncall_counts SET count = count - 1
+                WHERE teacher_id = OLD.teacher_id
+                AND year = OLD.year
+                AND week_start = {_week_start_sql("OLD.date")};
+                DELETE FROM oncall_counts WHERE count <= 0;
+                INSERT INTO oncall_counts (teacher_id, year, week_start, count)
+                SELECT NEW.teacher_id, NEW.year, {_week_start_sql("NEW.date")}, 1
+                WHERE NEW.teacher_id IS NOT NULL
+                ON CONFLICT (teacher_id, year, week_start) DO UPDATE SET count = count + 1;
+            END
+            """,
+        ],
+    ),
+    (
+        5,
+        "store only real absences, with the periods as a bitmask",
+        [
+            # bit 0 is period 1 ... bit 3 is period 4, as in oncall.models.period_mask; a row
+            # without an absent period is never stored
+            """
+            CREATE TABLE unfilled_absences_sparse (
+                id INTEGER PRIMARY KEY,
+                date TEXT NOT NULL,
+                teacher_id INTEGER NOT NULL,
+                periods INTEGER NOT NULL CHECK (periods BETWEEN 1 AND 15),
+                FOREIGN KEY (teacher_id) REFERENCES teachers (id)
+            )
+            """,
+            # keep the latest row when a teacher was saved twice for the same day
+            """
+            INSERT INTO unfilled_absences_sparse (id, date, teacher_id, periods)
+            SELECT id, date, teacher_id, periods FROM (
+                SELECT
+                    id,
+                    date,
+                    teacher_id,
+                    (COALESCE(period1, 0) != 0)
+                    | ((COALESCE(period2, 0) != 0) << 1)
+                    | ((COALESCE(period3, 0) != 0) << 2)
+                    | ((COALESCE(period4, 0) != 0) << 3) AS periods
+                FROM unfilled_absences
+                WHERE teacher_id IS NOT NULL
+                AND id IN (SELECT MAX(id) FROM unfilled_absences GROUP BY date, teacher_id)
+            )
+            WHERE periods != 0
+            """,
+            "DROP TABLE unfilled_absences",
+            "ALTER TABLE unfilled_absences_sparse RENAME TO unfilled_absences",
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_unfilled_absences_date
+            ON unfilled_absences (date, teacher_id)
+            """,
+        ],
+    ),
+    (
+        6,
+        "only clear the on-call counter that a trigger changed",
+        [
+            # the counter triggers used to delete every empty counter, scanning the whole
+            # table for each on-call row deleted or updated
+            "DROP TRIGGER IF EXISTS oncall_counts_delete",
+            "DROP TRIGGER IF EXISTS oncall_counts_update",
+            f"""
+            CREATE TRIGGER oncall_counts_delete
+            AFTER DELETE ON oncall_schedule
+            WHEN OLD.teacher_id IS NOT NULL
+            BEGIN
+                UPDATE oncall_counts SET count = count - 1
+                WHERE teacher_id = OLD.teacher_id
+                AND year = OLD.year
+                AND week_start = {_week_start_sql("OLD.date")};
+                DELETE FROM oncall_counts
+                WHERE teacher_id = OLD.teacher_id
+                AND year = OLD.year
+                AND week_start = {_week_start_sql("OLD.date")}
+                AND count <= 0;
+            END
+            """,
+            f"""
+            CREATE TRIGGER oncall_counts_update
+            AFTER UPDATE OF teacher_id, year, date ON oncall_schedule
+            BEGIN
+                UPDATE oncall_counts SET count = count - 1
+                WHERE teacher_id = OLD.teacher_id
+                AND year = OLD.year
+                AND week_start = {_week_start_sql("OLD.date")};
+                DELETE FROM oncall_counts
+                WHERE teacher_id = OLD.teacher_id
+                AND year = OLD.year
+                AND week_start = {_week_start_sql("OLD.date")}
+                AND count <= 0;
+                INSERT INTO oncall_counts (teacher_id, year, week_start, count)
+                SELECT NEW.teacher_id, NEW.year, {_week_start_sql("NEW.date")}, 1
+                WHERE NEW.teacher_id IS NOT NULL
+                ON CONFLICT (teacher_id, year, week_start) DO UPDATE SET count = count + 1;
+            END
+            """,
+        ],
+    ),
+]
+
+
+def get_schema_version(db_path: str | None = None) -> int:
+    """Return the highest migration version applied to the database, or 0 for a new one."""
+    with DatabaseConnection(db_path) as (conn, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_on TEXT DEFAULT CURRENT_TIMESTAMP
+            )
         """)
-        # Commit the changes and close the connection
-        conn.commit()
-        conn.close()
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+        version = cursor.fetchone()[0]
+    return version or 0
 
 
-def execute_query(query: str, params: tuple | list[tuple] = ()) -> Result:
-    """Execute a single SQL query with parameters."""
-    with DatabaseConnection() as (conn, cursor):
-        try:
+def apply_migrations(
+    db_path: str | None = None,
+    migrations: list[tuple[int, str, list[str]]] = MIGRATIONS,
+) -> list[int]:
+    """Apply every migration newer than the database's schema version, in order.
+
+    Returns the versions that were applied."""
+    current: int = get_schema_version(db_path)
+    applied: list[int] = []
+    for version, description, statements in sorted(migrations, key=lambda m: m[0]):
+        if version <= current:
+            continue
+        with Transaction(db_path) as conn:
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(
+                "INSERT INTO schema_version (version, description) VALUES (?, ?)",
+                (version, description),
+            )
+        applied.append(version)
+    return applied
 
-            if len(params) > 1:
+
+def initializeDB(db_path: str | None = None) -> None:
+    """Initialize the SQLite database, bringing its schema up to the latest migration."""
+    apply_migrations(db_path)
+
+
+def execute_query(query: str, params: tuple | list[tuple] = (), tag: str | None = None) -> Result:
+    """Execute a single SQL query with parameters on the pooled connection.
+
+    A list of tuples runs the query once per tuple. Inside a Transaction nothing is
+    committed or rolled back here; the Transaction block decides. The time taken and the
+    rows returned or changed are recorded in query_stats under tag, which defaults to the
+    calling function, and the query is timed as a "db" profiling span.
+    """
+    if query_stats.enabled and tag is None:
+        tag = _call_site()
+    with DatabaseConnection() as (conn, cursor), profiling.span(tag or "execute_query", "db"):
+        in_transaction: bool = get_pool().in_transaction()
+        start: float = time.perf_counter()
+        try:
+            if isinstance(params, list):
                 cursor.executemany(query, params)
             else:
                 cursor.execute(query, params)
             data: list = cursor.fetchall()
-            conn.commit()
+            if not in_transaction:
+                conn.commit()
+            if query_stats.enabled:
+                rows: int = len(data) if cursor.description else max(cursor.rowcount, 0)
+                query_stats.record(tag, query, params, time.perf_counter() - start, rows, conn=conn)
             return Result(success=True, message="Query executed successfully.", data=data)
         except Exception as e:
-            conn.rollback()
+            if not in_transaction:
+                conn.rollback()
+            if query_stats.enabled:
+                query_stats.record(tag, query, params, time.perf_counter() - start, 0, failed=True)
             return Result(success=False, message=f"Query failed: {str(e)}", data=[])
-        
-
-            
\ No newline at end of file
@@ -0,0 +1,114 @@
+# This file contains the wx grid helpers used by the desktop app.
+import wx
+import wx.grid as gridlib
+
+
+def darken_colour(colour, factor=0.9):
+    """Return a darker version of the given wx.Colour."""
+    r = int(colour.Red() * factor)
+    g = int(colour.Green() * factor)
+    b = int(colour.Blue() * factor)
+    return wx.Colour(r, g, b)
+
+
+class CustomGridTable(gridlib.GridTableBase):
+    """Table behind the data grids.
+
+    Cell attributes are served by GetAttr from a few shared GridCellAttr objects, one per
+    kind of column (bool or text) and row parity, instead of being set on every cell, so
+    the grid only does work for the cells it draws. With striped, odd rows get a darker
+    background.
+
+    Rows whose values are changed through SetValue are remembered in dirty until
+    mark_clean, so a save only needs to write those rows."""
+
+    def __init__(self, data, striped=False):
+        super().__init__()
+        self.data = data
+        self.dirty: set[int] = set()
+        self.col_labels = [
+            "ID",
+            "Name",
+            "Period 1",
+            "Period 2",
+            "Period 3",
+            "Period 4",
+            "All Day",
+        ]
+        # columns holding check boxes, recognised from the first row
+        self.bool_cols = {
+            col for col, value in enumerate(data[0] if data else []) if isinstance(value, bool)
+        }
+        background = wx.SystemSettings.GetColour(wx.SYS_COLOUR_WINDOW)
+        backgrounds = (background, darken_colour(background, 0.8) if striped else background)
+        # attrs[is_bool][row % 2]
+        self.attrs = [[self.text_attr(colour) for colour in backgrounds],
+                      [self.bool_attr(colour) for colour in backgrounds]]
+
+    @staticmethod
+    def text_attr(background):
+        attr = gridlib.GridCellAttr()
+        attr.SetBackgroundColour(background)
+        return attr
+
+    @staticmethod
+    def bool_attr(background):
+        attr = gridlib.GridCellAttr()
+        attr.SetBackgroundColour(background)
+        attr.SetEditor(OneClickBoolEditor())
+        attr.SetRenderer(gridlib.GridCellBoolRenderer())
+        attr.SetAlignment(wx.ALIGN_CENTER_HORIZONTAL, wx.ALIGN_CENTER_VERTICAL)
+        return attr
+
+    def GetAttr(self, row, col, kind):
+        attr = self.attrs[col in self.bool_cols][row % 2]
+        # the grid releases its reference when it is done with the attr
+        attr.IncRef()
+        return attr
+
+    def GetNumberRows(self):
+        return len(self.data)
+
+    def GetNumberCols(self):
+        return len(self.data[0]) if self.data else 0
+
+    def GetValue(self, row, col):
+        val = self.data[row][col]
+        return val
+
+    def SetValue(self, row, col, value):
+        if self.data[row][col] != value:
+            self.data[row][col] = value
+            self.dirty.add(row)
+
+    def set_row_values(self, row, cols, value):
+        """Set several columns of a row to the same value (e.g. every period for All Day)."""
+        for col in cols:
+            self.SetValue(row, col, value)
+
+    def get_dirty_rows(self):
+        """The rows changed since the table was loaded or last marked clean, in row order."""
+        return [list(self.data[row]) for row in sorted(self.dirty)]
+
+    def mark_clean(self):
+        self.dirty.clear()
+
+    def IsEmptyCell(self, row, col):
+        return False
+
+    def GetColLabelValue(self, col):
+        return self.col_labels[col]
+
+    def CanGetValueAs(self, row, col, typeName):
+        if isinstance(self.data[row][col], bool):
+            return typeName == "bool"
+        return False
+
+    def CanSetValueAs(self, row, col, typeName):
+        return self.CanGetValueAs(row, col, typeName)
+
+
+class OneClickBoolEditor(gridlib.GridCellBoolEditor):
+    def BeginEdit(self, row, col, grid):
+        super().BeginEdit(row, col, grid)
+        self.StartingClick()  # Triggers edit immediately
@@ -1,157 +1,189 @@
 # This file contains helper classes for managing teachers and their schedules.
-import wx.grid as gridlib
-from oncall import logic
-
-
-class Teacher:
-    """Class to manage instances of a teacher in the context of creating the on call schedule"""
+import heapq
+from oncall import db_config, logic, profiling, tasks
+# the record types live in oncall.models and are re-exported so existing imports keep working
+from oncall.models import (
+    Absence,
+    DaySnapshot,
+    FreePeriodPolicy,
+    OnCall,
+    Teacher,
+    TeacherList,
+    TeacherRow,
+    period_mask,
+)
+
+__all__ = [
+    "Absence",
+    "DaySnapshot",
+    "FreePeriodPolicy",
+    "OnCall",
+    "OnCallAssigner",
+    "OnCallRangeSchedule",
+    "OnCallSchedule",
+    "Teacher",
+    "TeacherList",
+    "TeacherRow",
+    "UnfilledAbsences",
+    "period_mask",
+    "without_oncalls",
+]
+
+
+class OnCallAssigner:
+    """Serves the least loaded available teacher for each period.
+
+    Candidates are kept in one heap per period keyed by (on-calls this week, on-calls this
+    year, original order), so each assignment costs O(log n). A teacher is handed out at
+    most once per day, and teachers already at the weekly or yearly maximum are never
+    offered.
+    """
 
     def __init__(
         self,
-        name,
-        period1=None,
-        period2=None,
-        period3=None,
-        period4=None,
-        oncalls=0,
-        available=None,
-        active=True,
-        id=None,
-    ):
-        self.id = id
-        self.name = name
-        self.period1 = period1
-        self.period2 = period2
-
-        self.period3 = period3
-        self.period4 = period4
-        if available:
-            self.available = available
-        else:
-            self.available = self.find_available_period()
-        self.active = active
-
-    def find_available_period(self):
-        """Find the first available period for the teacher."""
-        periodList = [self.period1, self.period2, self.period3, self.period4]
-        # If there is only one None period, it means the teacher is full time and the one non-working period
-        # is the avaiable period
-        if periodList.count(None) == 1:
-            if not self.period1:
-                return 1
-            elif not self.period2:
-                return 2
-            elif not self.period3:
-                return 3
-            elif not self.period4:
-                return 4
-            else:
-                return None
-        elif periodList.count(None) > 1:
-            # When there is more than one non-working period, the teacher isn't full time
-            # Find the first non-None period and attach the available period to the other side
-            # of the either AM or PM block of the day
-            workingPeriod = None
-            for i in range(len(periodList)):
-                if periodList[i]:
-                    workingPeriod = i
-                    break
-            if workingPeriod == 0 and not self.period2:
-                return 2
-            elif workingPeriod == 0 and not self.period3:
-                return 3
-            elif workingPeriod == 0 and not self.period4:
-                return 4
-            elif workingPeriod == 1 and not self.period1:
-                return 1
-            elif workingPeriod == 1 and not self.period3:
-                return 3
-            elif workingPeriod == 1 and not self.period4:
-                return 4
-            elif workingPeriod == 2 and not self.period4:
-                return 4
-            elif workingPeriod == 2 and not self.period2:
-                return 2
-            elif workingPeriod == 2 and not self.period1:
-                return 1
-            elif workingPeriod == 3 and not self.period3:
-                return 3
-            elif workingPeriod == 3 and not self.period1:
-                return 1
-            else:
-                return None
-        else:
+        available_teachers: list,
+        week_counts: dict[int, int] | None = None,
+        year_counts: dict[int, int] | None = None,
+        max_per_week: int | None = None,
+        max_per_year: int | None = None,
+    ) -> None:
+        self.week_counts = week_counts or {}
+        self.year_counts = year_counts or {}
+        self.max_per_week = max_per_week
+        self.max_per_year = max_per_year
+        self.taken: set[int] = set()
+        self.heaps: list[list[tuple]] = [[], [], [], []]
+        for order, row in enumerate(available_teachers):
+            teacher_id, period = row[0], row[6]
+            if period not in (1, 2, 3, 4) or not self.under_caps(teacher_id):
+                continue
+            self.heaps[period - 1].append(
+                (self.week_counts.get(teacher_id, 0), self.year_counts.get(teacher_id, 0), order, row)
+            )
+        for heap in self.heaps:
+            heapq.heapify(heap)
+
+    def under_caps(self, teacher_id: int) -> bool:
+        """True if the teacher can take another on-call without passing a maximum."""
+        if self.max_per_week is not None and self.week_counts.get(teacher_id, 0) >= self.max_per_week:
+            return False
+        if self.max_per_year is not None and self.year_counts.get(teacher_id, 0) >= self.max_per_year:
+            return False
+        return True
+
+    def next_teacher(self, period: int) -> list | None:
+        """Take the least loaded teacher free in the given period, or None if nobody is left."""
+        heap = self.heaps[period - 1]
+        # teachers marked taken are dropped lazily as they reach the top
+        while heap and heap[0][3][0] in self.taken:
+            heapq.heappop(heap)
+        if not heap:
             return None
+        row = heapq.heappop(heap)[3]
+        self.taken.add(row[0])
+        self.week_counts[row[0]] = self.week_counts.get(row[0], 0) + 1
+        self.year_counts[row[0]] = self.year_counts.get(row[0], 0) + 1
+        return row
 
-    def __repr__(self):
-        return f"Teacher(name={self.name}: Free period={self.available})"
+    def take(self, teacher_id: int) -> None:
+        """Mark a teacher as already on call today so they are not offered again."""
+        self.taken.add(teacher_id)
 
+    def remaining(self, period: int) -> int:
+        """Number of teachers still available in the given period."""
+        return sum(1 for entry in self.heaps[period - 1] if entry[3][0] not in self.taken)
 
-class TeacherList:
-    def __init__(self):
-        self.teachers = []
-        self.index = 0
-
-    def add_teacher(self, teacher):
-        self.teachers.append(teacher)
-
-    def remove_teacher(self, teacher):
-        self.teachers.remove(teacher)
-
-    def get_teachers(self):
-        return self.teachers
 
-    def __iter__(self):
-        self.index = 0
-        return self
+def without_oncalls(counts: dict[int, int], oncalls: list) -> dict[int, int]:
+    """A copy of per-teacher on-call counts less the given on-calls (get_schedule rows)."""
+    counts = dict(counts)
+    for oncall in oncalls:
+        teacher_id = oncall[1]
+        if teacher_id in counts:
+            counts[teacher_id] -= 1
+            if counts[teacher_id] <= 0:
+                del counts[teacher_id]
+    return counts
 
-    def __next__(self):
-        if self.index < len(self.teachers):
-            teacher = self.teachers[self.index]
-            self.index += 1
-            return teacher
-        else:
-            raise StopIteration
 
-
-class OnCall:
+class OnCallSchedule:
+    @profiling.profiled
     def __init__(
-        self, absent_teacher_id, teacher_id: int, date: str, year: str, period: str, half: str
-    ) -> None:
-        self.absent_teacher_id = absent_teacher_id
-        self.teacher_id = teacher_id
-        self.date = date
-        self.year = year
-        self.period = period
-        self.half = half
-
-    def __eq__(self, other):
-        if not isinstance(other, OnCall):
-            return NotImplemented
-        return (
-            self.teacher_id == other.teacher_id
-            and self.date == other.date
-            and self.period == other.period
-            and self.half == other.half
-        )
-
-    def __repr__(self):
-        return f"OnCall({self.teacher_id}, {self.date}, {self.period}, {self.half})"
-
+        self,
+        date: str,
+        max_per_week: int | None = None,
+        max_per_year: int | None = None,
+        available: list | None = None,
+        unfilled_absences: list | None = None,
+        teacher_list: "TeacherList | None" = None,
+        week_counts: dict[int, int] | None = None,
+        year_counts: dict[int, int] | None = None,
+        saved_schedule: list | None = None,
+    ):
+        """Load what is needed to schedule the date. Anything passed in (as the range
+        scheduler does from its bulk load) is used instead of querying the database.
 
-class OnCallSchedule:
-    def __init__(self, date: str):
+        The date's saved on-calls are about to be replaced, so counts loaded here leave them
+        out; counts passed in must already do so."""
         self.schedule = []
         self.date = date
         self.year = logic.get_school_year(date)
+        self.teacher_list = teacher_list
+        self.saved_schedule = saved_schedule
         # find all of the teachers who do not have an unfilled absence for the day
         # split those teachers into groups of which period they are available
-        # TODO attach total oncalls for year and oncalls for the week to the teachers as well
-        ### there is a maximum per week and per year that should be respected.
-        self.available_teachers = logic.split_available_teachers(
-            logic.get_available_teachers(date)
+        if available is None:
+            available = logic.get_available_teachers(date)
+        self.available_teachers = logic.split_available_teachers(available)
+        if unfilled_absences is None:
+            unfilled_absences = logic.get_unfilled_absences(date)
+        self.unfilled_absences = unfilled_absences
+        # load each teacher's on-calls for the week and the year once, so the least loaded
+        # teachers are chosen first and the maximums are respected
+        if week_counts is None or year_counts is None:
+            if self.saved_schedule is None:
+                self.saved_schedule = logic.get_oncall_schedule(date)
+        if week_counts is None:
+            week_counts = without_oncalls(logic.get_weekly_oncall_counts(date), self.saved_schedule)
+        if year_counts is None:
+            ids_by_name: dict[str, int] = {row[1]: row[0] for row in available}
+            year_counts = without_oncalls(
+                {
+                    ids_by_name[name]: total
+                    for name, total in logic.get_oncall_totals(self.year)
+                    if name in ids_by_name
+                },
+                self.saved_schedule,
+            )
+        with profiling.span("OnCallAssigner"):
+            self.assigner = OnCallAssigner(
+                available,
+                week_counts,
+                year_counts,
+                max_per_week,
+                max_per_year,
+            )
+
+    @classmethod
+    def from_snapshot(
+        cls,
+        snapshot: DaySnapshot,
+        max_per_week: int | None = None,
+        max_per_year: int | None = None,
+    ) -> "OnCallSchedule":
+        """Build the schedule for a snapshot's date without querying the database."""
+        saved: list = [list(row) for row in snapshot.schedule]
+        return cls(
+            snapshot.date,
+            max_per_week,
+            max_per_year,
+            available=snapshot.available,
+            unfilled_absences=list(snapshot.absences),
+            teacher_list=logic.teacher_list_from_rows(snapshot.teachers),
+            week_counts=without_oncalls(snapshot.week_counts, saved),
+            year_counts=without_oncalls(snapshot.year_counts, saved),
+            saved_schedule=saved,
         )
-        self.unfilled_absences = logic.get_unfilled_absences(date)
 
     def add_oncall(self, oncall: OnCall) -> int:
         if oncall not in self.schedule:
@@ -166,44 +198,78 @@ class OnCallSchedule:
         except ValueError:
             return 1
 
-    def schedule_oncalls(self) -> int:
-        """ Create a preliminary schedule of on calls to cover the unfilled absences"""
+    def absent_slots(self) -> list[tuple[int, int, str]]:
+        """List every (absent teacher id, period, half) that needs an on-call today."""
         #pull the teachers out of the database to be able to reference if the absent period
         #has a corresponsing class that period to be covered
-        teacher_list = logic.load_teacher_list_from_db()
-        for (
-            id,
-            date,
-            teacher_id,
-            period1,
-            period2,
-            period3,
-            period4,
-        ) in self.unfilled_absences:
-            current_teacher: Teacher = Teacher(None)
-            for teacher in teacher_list.teachers:
-                if teacher.id == teacher_id:
-                    current_teacher: Teacher = teacher
-                    break
-            if not current_teacher.name:
-                raise Exception
-            if period1 and current_teacher.period1:
-                self.apply_oncall(teacher_id, 1, "1st")
-                self.apply_oncall(teacher_id, 1, "2nd")
-            if period2 and current_teacher.period2:
-                self.apply_oncall(teacher_id, 2, "1st")
-                self.apply_oncall(teacher_id, 2, "2nd")
-            if period3 and current_teacher.period3:
-                self.apply_oncall(teacher_id, 3, "1st")
-                self.apply_oncall(teacher_id, 3, "2nd")
-            if period4 and current_teacher.period4:
-                self.apply_oncall(teacher_id, 4, "1st")
-                self.apply_oncall(teacher_id, 4, "2nd")
-        return 0
+        teacher_list = self.teacher_list
+        if teacher_list is None:
+            teacher_list = logic.load_teacher_list_from_db()
+        slots: list[tuple[int, int, str]] = []
+        for absence in self.unfilled_absences:
+            absence = Absence(*absence)
+            current_teacher: Teacher | None = teacher_list.get_by_id(absence.teacher_id)
+            if current_teacher is None:
+                raise Exception(f"Failed to find absent teacher {absence.teacher_id} in the teacher list.")
+            # only the periods the teacher is both absent and teaching need cover
+            to_cover: int = absence.mask & current_teacher.occupied
+            for period in range(1, 5):
+                if to_cover & (1 << (period - 1)):
+                    slots.append((absence.teacher_id, period, "1st"))
+                    slots.append((absence.teacher_id, period, "2nd"))
+        return slots
+
+    @profiling.profiled
+    def schedule_oncalls(self) -> int:
+        """ Create a preliminary schedule of on calls to cover the unfilled absences
+
+        Slots are filled one at a time from the least loaded teachers. A teacher is free in
+        at most one period, so this already covers as many slots as possible at the
+        lowest load. Slots nobody could cover are left in self.uncovered; returns 0 if every
+        slot was covered and 1 otherwise."""
+        self.uncovered: list[tuple[int, int, str]] = []
+        for absent_teacher, period, half in self.absent_slots():
+            if self.apply_oncall(absent_teacher, period, half):
+                self.uncovered.append((absent_teacher, period, half))
+        return 1 if self.uncovered else 0
+
+    @profiling.profiled
+    def reschedule(self) -> tuple[list, list]:
+        """Bring the saved schedule for the date up to date with the current absences.
+
+        Every saved on-call that still covers a needed slot with a teacher who is not absent
+        is kept as it is; only the slots that lost their cover or are new get a teacher.
+        Returns the (added, removed) rows in get_schedule format, for save_oncall_changes."""
+        slots: list[tuple[int, int, str]] = self.absent_slots()
+        needed: set[tuple[int, int, str]] = set(slots)
+        present: set[int] = {row[0] for period in self.available_teachers for row in period}
+        covered: set[tuple[int, int, str]] = set()
+        removed: list = []
+        self.schedule = []
+        saved: list = self.saved_schedule
+        if saved is None:
+            saved = logic.get_oncall_schedule(self.date)
+        for absent_teacher, teacher_id, year, date, period, half in saved:
+            slot = (absent_teacher, int(period[-1]), half)
+            oncall = OnCall(absent_teacher, teacher_id, date, year, period, half)
+            if slot in needed and slot not in covered and teacher_id in present:
+                covered.add(slot)
+                self.add_oncall(oncall)
+                self.assigner.take(teacher_id)
+            else:
+                removed.append([absent_teacher, teacher_id, year, date, period, half])
+        kept: int = len(self.schedule)
+        self.uncovered = []
+        for absent_teacher, period, half in slots:
+            if (absent_teacher, period, half) not in covered:
+                if self.apply_oncall(absent_teacher, period, half):
+                    self.uncovered.append((absent_teacher, period, half))
+        added: list = self.get_schedule()[kept:]
+        return added, removed
 
     def apply_oncall(self, absent_teacher, period, half):
-        if len(self.available_teachers[period - 1]) > 0:
-            teacher = self.available_teachers[period - 1].pop(0)
+        teacher = self.assigner.next_teacher(period)
+        if teacher is not None:
             self.add_oncall(
                 OnCall(absent_teacher, teacher[0], self.date, self.year, f"period{period}", half)
             )
@@ -216,6 +282,98 @@ class OnCallSchedule:
         return [[x.absent_teacher_id, x.teacher_id, x.year, x.date, x.period, x.half] for x in self.schedule]
 
 
+class OnCallRangeSchedule:
+    """Schedules every day in a date range from a single bulk load.
+
+    Teachers, absences and on-call history for the whole range are read once up front.
+    Each day's assignments are then added to the in-memory weekly and yearly counters
+    before the next day is scheduled, so load is balanced across the range.
+    """
+
+    @profiling.profiled
+    def __init__(
+        self,
+        start: str,
+        end: str,
+        max_per_week: int | None = None,
+        max_per_year: int | None = None,
+    ):
+        self.dates: list[str] = logic.date_range(start, end)
+        self.max_per_week = max_per_week
+        self.max_per_year = max_per_year
+        self.teacher_list: TeacherList = logic.load_teacher_list_from_db()
+        self.teachers: list = logic.get_teachers_from_db(active_only=True)
+        self.absences: dict[str, list] = logic.get_unfilled_absences_between(start, end)
+        # history covers whole weeks, from the first day's week to the last day's, so
+        # weekly counts include on-calls saved on either side of the range
+        self.daily_counts: dict[str, dict[int, int]] = logic.get_daily_oncall_counts(
+            logic.current_week(start)[0], logic.current_week(end)[1]
+        )
+        self.year_counts: dict[str, dict[int, int]] = logic.get_yearly_oncall_counts(
+            sorted({logic.get_school_year(day) for day in self.dates})
+        )
+        self.schedules: dict[str, OnCallSchedule] = {}
+
+    def week_counts(self, day: str) -> dict[int, int]:
+        """Sum the in-memory daily counts over the week containing the day."""
+        counts: dict[int, int] = {}
+        for week_day in logic.date_range(*logic.current_week(day)):
+            for teacher_id, total in self.daily_counts.get(week_day, {}).items():
+                counts[teacher_id] = counts.get(teacher_id, 0) + total
+        return counts
+
+    @profiling.profiled
+    def schedule_oncalls(self) -> int:
+        """Schedule each day of the range in order; returns 1 if any slot went uncovered."""
+        status: int = 0
+        for done, day in enumerate(self.dates):
+            tasks.check_cancelled()
+            tasks.report_progress(done, len(self.dates), f"Scheduling {day}")
+            absences: list = self.absences.get(day, [])
+            absent_ids: set[int] = {row[2] for row in absences if any(row[3:7])}
+            year: str = logic.get_school_year(day)
+            year_counts: dict[int, int] = self.year_counts.setdefault(year, {})
+            # a saved schedule for this day is replaced, so it no longer counts as history
+            for teacher_id, total in self.daily_counts.pop(day, {}).items():
+                year_counts[teacher_id] = year_counts.get(teacher_id, 0) - total
+            schedule = OnCallSchedule(
+                day,
+                self.max_per_week,
+                self.max_per_year,
+                available=[row for row in self.teachers if row[0] not in absent_ids],
+                unfilled_absences=absences,
+                teacher_list=self.teacher_list,
+                week_counts=self.week_counts(day),
+                year_counts=dict(year_counts),
+            )
+            status |= schedule.schedule_oncalls()
+            day_counts: dict[int, int] = {}
+            for oncall in schedule.schedule:
+                day_counts[oncall.teacher_id] = day_counts.get(oncall.teacher_id, 0) + 1
+                year_counts[oncall.teacher_id] = year_counts.get(oncall.teacher_id, 0) + 1
+            self.daily_counts[day] = day_counts
+            self.schedules[day] = schedule
+        return status
+
+    def get_schedule(self) -> list:
+        """Get the schedule for every day of the range in display format, in date order."""
+        return [row for day in self.dates if day in self.schedules for row in self.schedules[day].get_schedule()]
+
+    @profiling.profiled
+    def save(self) -> None:
+        """Save every scheduled day in a single transaction. A day left with no on-calls
+        has its saved on-calls removed, as the in-memory counts already treat them as
+        replaced."""
+        with db_config.Transaction():
+            for day in self.dates:
+                if day not in self.schedules:
+                    continue
+                if self.schedules[day].schedule:
+                    logic.save_oncall_schedule(self.schedules[day].get_schedule())
+                else:
+                    logic.delete_oncall_schedule(day)
+
+
 class UnfilledAbsences:
     def __init__(self):
         self.absences = []
@@ -228,54 +386,3 @@ class UnfilledAbsences:
 
     def get_absences(self):
         return self.absences
-
-
-class CustomGridTable(gridlib.GridTableBase):
-    def __init__(self, data):
-        super().__init__()
-        self.data = data
-        self.col_labels = [
-            "ID",
-            "Name",
-            "Period 1",
-            "Period 2",
-            "Period 3",
-            "Period 4",
-            "All Day",
-        ]
-        self.attr_bool = gridlib.GridCellAttr()
-        self.attr_bool.SetEditor(OneClickBoolEditor())
-        self.attr_bool.SetRenderer(gridlib.GridCellBoolRenderer())
-
-    def GetNumberRows(self):
-        return len(self.data)
-
-    def GetNumberCols(self):
-        return len(self.data[0]) if self.data else 0
-
-    def GetValue(self, row, col):
-        val = self.data[row][col]
-        return val
-
-    def SetValue(self, row, col, value):
-        self.data[row][col] = value
-
-    def IsEmptyCell(self, row, col):
-        return False
-
-    def GetColLabelValue(self, col):
-        return self.col_labels[col]
-
-    def CanGetValueAs(self, row, col, typeName):
-        if isinstance(self.data[row][col], bool):
-            return typeName == "bool"
-        return False
-
-    def CanSetValueAs(self, row, col, typeName):
-        return self.CanGetValueAs(row, col, typeName)
-
-
-class OneClickBoolEditor(gridlib.GridCellBoolEditor):
-    def BeginEdit(self, row, col, grid):
-        super().BeginEdit(row, col, grid)
-        self.StartingClick()  # Triggers edit immediately
@@ -1,33 +1,135 @@
+from __future__ import annotations
+
+import csv
+import functools
+import itertools
+import pathlib
+import threading
 import oncall.db_config as db_config
-import polars as pl
-from oncall.helper_classes import TeacherList, Teacher
+from oncall import profiling, tasks
+from oncall.models import Absence, DaySnapshot, TeacherList, Teacher, TeacherRow, period_mask
 from datetime import datetime, timedelta, date
-from typing import List, Union
+from types import MappingProxyType
+from oncall.startup import lazy_import
+from typing import Callable, Iterable, Iterator, List, Union
+
+# polars and fastexcel are only needed to import a timetable, so they are loaded on first use
+# rather than slowing down every start up
+pl = lazy_import("polars")
+fastexcel = lazy_import("fastexcel")
+
+
+# Read cache for the hot readers. Each table has a generation that its writers bump; a
+# cached result is served until a table it was read from changes generation, or until
+# another connection (e.g. the command line run from cron) commits to the database.
+_generations: dict[str, int] = {"teachers": 0, "unfilled_absences": 0, "oncall_schedule": 0}
+_cache: dict[tuple, tuple[tuple, object]] = {}
+_cache_lock = threading.Lock()
+
+
+def bump_generation(*tables: str) -> None:
+    """Mark the given tables as changed so cached reads of them are refreshed.
+
+    Inside a Transaction the tables are bumped again once it commits: until then other
+    threads still read the old rows, and could cache them under the new generation."""
+    with _cache_lock:
+        for table in tables:
+            _generations[table] += 1
+    pool = db_config.get_pool()
+    if pool.in_transaction():
+        pool.after_commit(functools.partial(bump_generation, *tables))
+
+
+def clear_cache() -> None:
+    """Drop every cached read."""
+    with _cache_lock:
+        _cache.clear()
+
 
+def cached_read(*tables: str, copy: Callable | None = None) -> Callable:
+    """Cache a reader's result per set of arguments until one of the tables changes.
 
+    copy, when given, is applied to every result handed out so callers that edit what they
+    get back don't alter the cached value. Reads inside a Transaction are never cached, as
+    they may see writes that are later rolled back."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args):
+            if db_config.get_pool().in_transaction():
+                return func(*args)
+            stamp: tuple = (db_config.external_changes(), *(_generations[t] for t in tables))
+            key: tuple = (func.__name__, args)
+            with _cache_lock:
+                hit = _cache.get(key)
+            if hit is not None and hit[0] == stamp:
+                value = hit[1]
+            else:
+                value = func(*args)
+                with _cache_lock:
+                    _cache[key] = (stamp, value)
+            return copy(value) if copy else value
+        return wrapper
+    return decorator
+
+
+@cached_read("teachers")
 def load_teacher_list_from_db() -> TeacherList:
-    """Load the teacher list from the SQLite database."""
+    """Load the teacher list from the SQLite database. The list is shared between callers
+    until the teachers change, so treat it as read only."""
     query: str = "SELECT * FROM teachers"
     paramaters: tuple = ()
     result = db_config.execute_query(query, paramaters)
     if result.success:
-        teacher_list = TeacherList()
-        for row in result.data:
-            """Create a Teacher object from the row data and add it to the TeacherList."""
-            teacher = Teacher(
-                id=row[0],
-                name=row[1],
-                period1=row[2],
-                period2=row[3],
-                period3=row[4],
-                period4=row[5],
-            )
-            teacher_list.add_teacher(teacher)
+        teacher_list = teacher_list_from_rows(result.data)
     else:
         raise Exception("Failed to load teacher list from database.")
     return teacher_list
 
 
+def teacher_list_from_rows(rows: Iterable) -> TeacherList:
+    """Build a TeacherList from rows of the teachers table."""
+    teacher_list = TeacherList()
+    for row in rows:
+        """Create a Teacher object from the row data and add it to the TeacherList."""
+        teacher = Teacher(
+            id=row[0],
+            name=row[1],
+            period1=row[2],
+            period2=row[3],
+            period3=row[4],
+            period4=row[5],
+            active=bool(row[7]),
+        )
+        teacher_list.add_teacher(teacher)
+    return teacher_list
+
+
+def get_teachers_from_db(active_only: bool = False) -> list:
+    """Get every teacher row, or only the active ones, from the database in the same format
+    as get_available_teachers."""
+    query: str = "SELECT * FROM teachers"
+    if active_only:
+        query += " WHERE active = 1"
+    result: db_config.Result = db_config.execute_query(query)
+    if not result.success:
+        raise Exception("Failed to load teachers from database.")
+    return [TeacherRow(*row) for row in result.data]
+
+
+# unfilled_absences stores the absent periods as a bitmask (bit 0 is period 1); this reads a
+# row back in the Absence layout: id, date, teacher id, period 1, period 2, period 3, period 4
+ABSENCE_COLUMNS: str = """
+    id,
+    date,
+    teacher_id,
+    (periods & 1) != 0,
+    (periods & 2) != 0,
+    (periods & 4) != 0,
+    (periods & 8) != 0
+"""
+
+
+@cached_read("teachers", "unfilled_absences", copy=lambda rows: [list(row) for row in rows])
 def get_absences_from_db(date: str) -> list:
     """grab the currently active teacher list with all absences for the provided date in the
     following format teaher id, teacher name, period 1, period 2, period 3, period 4"""
@@ -36,14 +138,13 @@ def get_absences_from_db(date: str) -> list:
         SELECT 
             teachers.teacher_id, 
             teachers.teacher_name, 
-            ua.period1, 
-            ua.period2, 
-            ua.period3, 
-            ua.period4
+            COALESCE(ua.periods, 0) & 1,
+            COALESCE(ua.periods, 0) & 2,
+            COALESCE(ua.periods, 0) & 4,
+            COALESCE(ua.periods, 0) & 8
         FROM teachers
-        LEFT JOIN (
-            SELECT * FROM unfilled_absences WHERE date = ?
-        ) ua ON teachers.teacher_id = ua.teacher_id
+        LEFT JOIN unfilled_absences ua
+            ON ua.teacher_id = teachers.teacher_id AND ua.date = ?
         WHERE teachers.active = 1
         """
     params: tuple[str] =  (date,)
@@ -65,134 +166,391 @@ def get_absences_from_db(date: str) -> list:
         raise Exception("Failed to load absences from database.")
 
 
-def load_schedule_from_file(file_path: str) -> dict[str, list[Teacher]]:
-    """Load a schedule from a file."""
+# rows read from a timetable at a time, so long imports can report progress and be cancelled
+IMPORT_BATCH_SIZE: int = 1000
+
+
+@functools.cache
+def teacher_frame_schema() -> dict[str, pl.DataType]:
+    """Columns and types of the teacher frames produced by a timetable import."""
+    return {
+        "teacher_name": pl.Utf8,
+        "period1": pl.Utf8,
+        "period2": pl.Utf8,
+        "period3": pl.Utf8,
+        "period4": pl.Utf8,
+        "available": pl.Int64,
+    }
+
+
+def free_period_expr(period_columns: list[str]) -> pl.Expr:
+    """Polars expression giving each row's free period, resolved through the same table as
+    Teacher.find_available_period. A period counts as taught when its cell is not empty."""
+    policy = Teacher.free_period_policy
+    mask: pl.Expr = pl.lit(0)
+    for bit, column in enumerate(period_columns):
+        taught: pl.Expr = pl.col(column).is_not_null() & (pl.col(column).cast(pl.Utf8) != "")
+        mask = mask + taught.cast(pl.Int64) * (1 << bit)
+    return mask.replace_strict(
+        list(range(len(policy.table))), policy.table, return_dtype=pl.Int64
+    )
+
+
+@profiling.profiled
+def load_schedule_from_file(file_path: str) -> dict[str, pl.DataFrame]:
+    """Load a schedule from a file and work out how it differs from the stored teachers.
+
+    Nothing is written here, so the result doubles as a dry run. The file may be a CSV or a
+    workbook with one sheet per school. The sheet is processed as whole columns: period
+    cells are normalized and each teacher's free period resolved in one pass. Each
+    teacher's periods, free period and active flag are then hashed on both sides. Teachers
+    whose hash matches their stored one are unchanged. Only new teachers, teachers whose
+    hash differs (including a returning inactive teacher), and active teachers missing
+    from the sheet need writing. Each frame has the columns teacher_name, period1,
+    period2, period3, period4 and available."""
     # Read the schedule from the provided file path
-    schedule: pl.DataFrame = pl.read_excel(file_path)
+    batches: list[pl.DataFrame] = []
+    rows: int = 0
+    # the whole file is needed anyway, so each sheet is read in one pass; progress is
+    # reported as the loaded rows are normalized in batches
+    sheets = profiling.iterate(read_schedule_batches(file_path), "read_schedule_batches", "excel")
+    for sheet in sheets:
+        for offset in range(0, sheet.height, IMPORT_BATCH_SIZE):
+            tasks.check_cancelled()
+            batch: pl.DataFrame = sheet.slice(offset, IMPORT_BATCH_SIZE)
+            with profiling.span("normalize_schedule"):
+                batches.append(normalize_schedule(batch))
+            rows += batch.height
+            tasks.report_progress(rows, message=f"Read {rows} rows")
+    schedule: pl.DataFrame = (
+        pl.concat(batches).unique(subset="teacher_name", keep="first", maintain_order=True)
+        if batches
+        else pl.DataFrame(schema=teacher_frame_schema())
+    )
+    existing: pl.DataFrame = load_existing_teachers_frame()
+    with profiling.span("classify_teachers"):
+        results: dict[str, pl.DataFrame] = classify_teachers(schedule, existing)
+        results["inactive_teachers"] = find_inactive_teachers(
+            existing, schedule["teacher_name"].to_list()
+        )
+    return results
+
+
+@profiling.profiled
+def import_schedule_streaming(
+    file_path: str, batch_size: int = IMPORT_BATCH_SIZE, dry_run: bool = False
+) -> dict[str, int]:
+    """Import a timetable file in batches of at most batch_size rows.
+
+    Each batch is normalized, classified against the stored teachers and written before the
+    next is read. For a CSV file only one batch is held at a time however large it is; a
+    workbook sheet is parsed whole first (see read_schedule_batches). A
+    teacher named again in a later batch or sheet keeps their first row. Teachers missing
+    from the whole file are deactivated at the end, and everything commits together. With
+    dry_run nothing is written. Returns how many teachers fell in each group."""
+    existing: pl.DataFrame = load_existing_teachers_frame()
+    counts: dict[str, int] = {
+        "new_teachers": 0,
+        "updated_teachers": 0,
+        "inactive_teachers": 0,
+        "unchanged_teachers": 0,
+    }
+    seen: set[str] = set()
+    with db_config.Transaction():
+        rows: int = 0
+        batches = profiling.iterate(
+            read_schedule_batches(file_path, batch_size), "read_schedule_batches", "excel"
+        )
+        for batch in batches:
+            # cancelling rolls back the batches already written
+            tasks.check_cancelled()
+            rows += batch.height
+            with profiling.span("classify_teachers"):
+                schedule: pl.DataFrame = normalize_schedule(batch)
+                schedule = schedule.filter(~pl.col("teacher_name").is_in(list(seen)))
+                seen.update(schedule["teacher_name"].to_list())
+                results: dict[str, pl.DataFrame] = classify_teachers(schedule, existing)
+            if not dry_run:
+                handle_new_teachers(results["new_teachers"])
+                handle_updated_teachers(results["updated_teachers"])
+            for key, frame in results.items():
+                counts[key] += frame.height
+            tasks.report_progress(rows, message=f"Imported {rows} rows")
+        inactive: pl.DataFrame = find_inactive_teachers(existing, list(seen))
+        if not dry_run:
+            handle_inactive_teachers(inactive)
+        counts["inactive_teachers"] = inactive.height
+    return counts
+
+
+def read_schedule_batches(file_path: str, batch_size: int | None = None) -> Iterator[pl.DataFrame]:
+    """Yield the raw rows of a timetable file as frames of at most batch_size rows
+    (everything at once when batch_size is None).
+
+    CSV files are read with the csv module a batch at a time, so only one batch is held in
+    memory. fastexcel cannot stream rows, so each sheet of a workbook is parsed once in
+    full and the batches are slices of it; a workbook with a sheet per school yields every
+    school's rows."""
+    if pathlib.Path(file_path).suffix.lower() == ".csv":
+        with open(file_path, newline="", encoding="utf-8-sig") as handle:
+            reader = csv.reader(handle)
+            header: list[str] = next(reader, [])
+            while True:
+                rows: list[list[str]] = list(itertools.islice(reader, batch_size))
+                if not rows:
+                    return
+                width: int = len(header)
+                # columns are used by position; header names can repeat or be blank
+                yield pl.DataFrame(
+                    [(row + [""] * width)[:width] for row in rows],
+                    schema={f"column_{index}": pl.Utf8 for index in range(width)},
+                    orient="row",
+                )
+                if batch_size is None:
+                    return
+    workbook = fastexcel.read_excel(file_path)
+    for sheet_name in workbook.sheet_names:
+        # loading from an offset parses the sheet again from the top, so load it once
+        sheet: pl.DataFrame = workbook.load_sheet(sheet_name).to_polars()
+        if not sheet.width:
+            continue
+        for offset in range(0, sheet.height, batch_size or max(sheet.height, 1)):
+            yield sheet.slice(offset, batch_size)
+
+
+@profiling.profiled
+def load_existing_teachers_frame() -> pl.DataFrame:
+    """Load the stored teachers as a frame with the import columns plus active."""
     # setup and execute the query to check if the teachers already exist in the database
-    query: str = "SELECT teacher_name FROM teachers"
+    query: str = """
+        SELECT teacher_name, period1, period2, period3, period4, available, active
+        FROM teachers
+        """
     params: tuple = ()
     result = db_config.execute_query(query, params)
-
-    #setup teacher lists
-    update_teachers: list = []
-    new_teachers: list = []
-        
-    if result.success:
-        if result.data:
-            existing_teachers: list = [teacher[0] for teacher in result.data]
-        else:
-            existing_teachers: list = []
-        # if teacher exists: add to  update_teachers else add to new_teachers, 
-        for row in schedule.iter_rows():
-            if row[0]:
-                teacher: Teacher = Teacher(
-                    name=row[0],
-                    period1=row[1],
-                    period2=row[2],
-                    period3=row[4],
-                    period4=row[5],
-                )
-                if teacher.name in existing_teachers:
-                    # If the teacher already exists, add to update_teachers
-                    update_teachers.append(teacher)
-                else:
-                    # If the teacher does not exist, add to new_teachers
-                    new_teachers.append(teacher)
-        updated_teacher_names: list[str] = [x.name for x in update_teachers]
-        inactive_teachers: list[Teacher] = [Teacher(name) for name in existing_teachers if name not in updated_teacher_names]
-    else:
+    if not result.success:
         print(result.message)
-        raise Exception("Failed to load existing teachers from database.")  
+        raise Exception("Failed to load existing teachers from database.")
+    return pl.DataFrame(
+        result.data, schema=teacher_frame_schema() | {"active": pl.Int64}, orient="row"
+    ).unique(subset="teacher_name", keep="first", maintain_order=True)
+
+
+def classify_teachers(schedule: pl.DataFrame, existing: pl.DataFrame) -> dict[str, pl.DataFrame]:
+    """Split normalized timetable rows into new, updated and unchanged teachers by comparing
+    their fingerprints with the stored teachers."""
+    stored: pl.DataFrame = existing.select(
+        "teacher_name", teacher_fingerprint().alias("stored_fingerprint")
+    )
+    matched: pl.DataFrame = schedule.with_columns(
+        teacher_fingerprint(active=1).alias("fingerprint")
+    ).join(stored, on="teacher_name", how="inner", maintain_order="left")
+    changed: pl.Expr = pl.col("fingerprint") != pl.col("stored_fingerprint")
     return {
-        "updated_teachers": update_teachers,
-        "new_teachers": new_teachers,
-        "inactive_teachers": inactive_teachers,
+        "updated_teachers": matched.filter(changed).select(schedule.columns),
+        "new_teachers": schedule.join(existing, on="teacher_name", how="anti"),
+        "unchanged_teachers": matched.filter(~changed).select(schedule.columns),
     }
 
-def handle_new_teachers(new_teachers: List[Teacher]) -> None:
+
+def find_inactive_teachers(existing: pl.DataFrame, names: list[str]) -> pl.DataFrame:
+    """Return the stored active teachers whose names are not in the timetable."""
+    return (
+        existing.filter(pl.col("active") == 1, ~pl.col("teacher_name").is_in(names))
+        .select(teacher_frame_schema().keys())
+    )
+
+
+def teacher_fingerprint(active: int | None = None) -> pl.Expr:
+    """Hash of a teacher's periods, free period and active flag, for spotting changed rows.
+    Pass active to hash a literal flag instead of an active column."""
+    active_expr: pl.Expr = pl.col("active") if active is None else pl.lit(active)
+    return pl.struct(
+        pl.col("period1"),
+        pl.col("period2"),
+        pl.col("period3"),
+        pl.col("period4"),
+        pl.col("available").cast(pl.Int64),
+        active_expr.cast(pl.Int64).alias("active"),
+    ).hash()
+
+
+def summarize_import(results: dict[str, pl.DataFrame], limit: int = 10) -> str:
+    """Describe what applying load_schedule_from_file's results would change."""
+    lines: list[str] = []
+    for key, label in (
+        ("new_teachers", "new"),
+        ("updated_teachers", "updated"),
+        ("inactive_teachers", "deactivated"),
+    ):
+        names: list[str] = results[key]["teacher_name"].to_list()
+        line: str = f"{len(names)} {label}"
+        if names:
+            shown: str = ", ".join(names[:limit])
+            more: str = f" and {len(names) - limit} more" if len(names) > limit else ""
+            line += f": {shown}{more}"
+        lines.append(line)
+    lines.append(f"{results['unchanged_teachers'].height} unchanged")
+    return "\n".join(lines)
+
+
+def normalize_schedule(schedule: pl.DataFrame) -> pl.DataFrame:
+    """Turn a raw timetable sheet into teacher_name, period1-4 and available columns.
+
+    The teacher's name is the first column and periods 1-4 are the second, third, fifth
+    and sixth. Cells are trimmed and blanks become nulls, rows without a name are dropped
+    and only the first row for each name is kept."""
+    columns: list[str] = schedule.columns
+    names: list[str] = ["teacher_name", "period1", "period2", "period3", "period4"]
+    schedule = schedule.select(
+        pl.col(columns[index]).cast(pl.Utf8).str.strip_chars().alias(name)
+        for index, name in zip((0, 1, 2, 4, 5), names)
+    )
+    schedule = schedule.with_columns(
+        pl.when(pl.col(name) == "").then(None).otherwise(pl.col(name)).alias(name)
+        for name in names
+    )
+    return (
+        schedule.filter(pl.col("teacher_name").is_not_null())
+        .unique(subset="teacher_name", keep="first", maintain_order=True)
+        .with_columns(free_period_expr(names[1:]).alias("available"))
+        .cast(teacher_frame_schema())
+    )
+
+@profiling.profiled
+def handle_new_teachers(new_teachers: pl.DataFrame) -> None:
     """Handle new teachers by adding them to the database."""
-    if not new_teachers:
+    if new_teachers.is_empty():
         return
 
     query: str = """
-        INSERT INTO teachers (teacher_name, period1, period2, period3, period4)
-        VALUES (?, ?, ?, ?, ?)
+        INSERT INTO teachers (teacher_name, period1, period2, period3, period4, available)
+        VALUES (?, ?, ?, ?, ?, ?)
     """
-    params: List[tuple] = [
-        (teacher.name, teacher.period1, teacher.period2, teacher.period3, teacher.period4)
-        for teacher in new_teachers
-    ]
+    params: List[tuple] = new_teachers.select(
+        "teacher_name", "period1", "period2", "period3", "period4", "available"
+    ).rows()
     
     result: db_config.Result = db_config.execute_query(query, params)
     if not result.success:
         raise Exception("Failed to add new teachers to the database.")
+    bump_generation("teachers")
     
-def handle_updated_teachers(updated_teachers: List[Teacher]) -> None:
-    """Handle updated teachers by updating their information in the database."""
-    if not updated_teachers:
+@profiling.profiled
+def handle_updated_teachers(updated_teachers: pl.DataFrame) -> None:
+    """Handle updated teachers by updating their information in the database. A teacher
+    back on the timetable is made active again."""
+    if updated_teachers.is_empty():
         return
     query: str = """
         UPDATE teachers
-        SET period1 = ?, period2 = ?, period3 = ?, period4 = ?
+        SET period1 = ?, period2 = ?, period3 = ?, period4 = ?, available = ?, active = 1
         WHERE teacher_name = ?
     """
-    params: List[tuple] = [
-        (teacher.period1, teacher.period2, teacher.period3, teacher.period4, teacher.name)
-        for teacher in updated_teachers
-    ]
+    params: List[tuple] = updated_teachers.select(
+        "period1", "period2", "period3", "period4", "available", "teacher_name"
+    ).rows()
     result: db_config.Result = db_config.execute_query(query, params)
     if not result.success:
         raise Exception("Failed to update teachers in the database.")
+    bump_generation("teachers")
     
-def handle_inactive_teachers(inactive_teachers: List[Teacher]) -> None:
+@profiling.profiled
+def handle_inactive_teachers(inactive_teachers: pl.DataFrame) -> None:
     """Handle inactive teachers by deactivating them in the database."""
-    if not inactive_teachers:
+    if inactive_teachers.is_empty():
         return
     query: str = """
         UPDATE teachers
         SET active = 0
         WHERE teacher_name = ?
     """
-    params: List[tuple] = [(teacher.name,) for teacher in inactive_teachers]
+    params: List[tuple] = inactive_teachers.select("teacher_name").rows()
     result: db_config.Result = db_config.execute_query(query, params)
     if not result.success:
         raise Exception("Failed to deactivate teachers in the database.")
+    bump_generation("teachers")
+
+
+@profiling.profiled
+def apply_schedule_import(results: dict[str, pl.DataFrame]) -> None:
+    """Write the changes found by load_schedule_from_file as one commit, so a failure
+    leaves the teachers untouched."""
+    with db_config.Transaction():
+        handle_new_teachers(results["new_teachers"])
+        handle_updated_teachers(results["updated_teachers"])
+        handle_inactive_teachers(results["inactive_teachers"])
+
+
+def absence_params(date: str, teacher_absences: Iterable) -> List[tuple]:
+    """(date, teacher id, periods bitmask) for each row in get_absences_from_db format. Rows
+    without an absent period get a mask of 0."""
+    params: List[tuple] = []
+    for absence in teacher_absences:
+        if isinstance(absence, (list, tuple)) and len(absence) == 7:
+            # absence[0] is the teacher id and absence[2:6] periods 1 to 4
+            params.append((date, absence[0], period_mask(*absence[2:6])))
+    return params
 
 
 def save_absences_to_db(
     date: str, teacher_absences: List[Union[str, int, bool]]
 ) -> None:
-    """Save the absences to the database."""
-    query: str = "DELETE FROM unfilled_absences WHERE date = ?"
-    params: tuple = (date,)
-    result: db_config.Result = db_config.execute_query(query, params)
-    if not result.success:
-        raise Exception("Failed to clear existing absences for the date.")
-    
-    params2: List[tuple] = []
-    for absence in teacher_absences:
-        if isinstance(absence, (list, tuple)) and len(absence) == 7:
-            params2.append(
-                (
-                    date,
-                    absence[0],  # teacher_id
-                    absence[2],  # period1
-                    absence[3],  # period2
-                    absence[4],  # period3
-                    absence[5],  # period4
-                )
-            )
-           
-    query2: str = """INSERT INTO unfilled_absences (date, teacher_id, period1, period2, period3, period4)
-                        VALUES (?, ?, ?, ?, ?, ?)"""
-    result2: db_config.Result = db_config.execute_query(query2, params2)
-    if not result2.success:
-        raise Exception("Failed to save absences to the database.")
+    """Save the absences to the database.
 
+    The existing absences for the date are replaced in a single transaction, so the day is
+    never left with its absences deleted but not re-inserted. Only teachers with an absent
+    period are stored."""
+    params2: List[tuple] = [row for row in absence_params(date, teacher_absences) if row[2]]
 
-def get_available_teachers(date: str) -> List[str]:
-    """Get a list of teachers from the database who for the current day, don't have an absence"""
+    with db_config.Transaction():
+        query: str = "DELETE FROM unfilled_absences WHERE date = ?"
+        params: tuple = (date,)
+        result: db_config.Result = db_config.execute_query(query, params)
+        if not result.success:
+            raise Exception("Failed to clear existing absences for the date.")
+
+        # a teacher listed twice keeps their last row
+        query2: str = """INSERT INTO unfilled_absences (date, teacher_id, periods)
+                            VALUES (?, ?, ?)
+                            ON CONFLICT (date, teacher_id) DO UPDATE SET periods = excluded.periods"""
+        result2: db_config.Result = db_config.execute_query(query2, params2)
+        if not result2.success:
+            raise Exception("Failed to save absences to the database.")
+        bump_generation("unfilled_absences")
+
+
+def save_absence_changes(date: str, changed_absences: list) -> None:
+    """Save only the given teachers' absences for the date, leaving everyone else's alone.
+
+    Each changed row (get_absences_from_db format) is upserted on (date, teacher_id); a row
+    with no absent period removes the teacher's stored absence instead."""
+    if not changed_absences:
+        return
+    params: List[tuple] = absence_params(date, changed_absences)
+    with db_config.Transaction():
+        query: str = "DELETE FROM unfilled_absences WHERE date = ? AND teacher_id = ?"
+        result: db_config.Result = db_config.execute_query(
+            query, [(date, teacher_id) for date, teacher_id, periods in params if not periods]
+        )
+        if not result.success:
+            raise Exception("Failed to clear changed absences for the date.")
+
+        query2: str = """INSERT INTO unfilled_absences (date, teacher_id, periods)
+                            VALUES (?, ?, ?)
+                            ON CONFLICT (date, teacher_id) DO UPDATE SET periods = excluded.periods"""
+        result2: db_config.Result = db_config.execute_query(
+            query2, [row for row in params if row[2]]
+        )
+        if not result2.success:
+            raise Exception("Failed to save absences to the database.")
+        bump_generation("unfilled_absences")
+
+
+@cached_read("teachers", "unfilled_absences", copy=list)
+def get_available_teachers(date: str) -> List[TeacherRow]:
+    """Get a list of the active teachers from the database who for the current day, don't
+    have an absence"""
 
     query: str = """
         SELECT 
@@ -200,27 +558,20 @@ def get_available_teachers(date: str) -> List[str]:
         FROM 
           teachers 
         WHERE 
-          teacher_id NOT IN (
+          active = 1
+          AND teacher_id NOT IN (
             SELECT 
               teacher_id 
             FROM 
               unfilled_absences 
             WHERE 
               date = ?
-            AND
-              (period1 = 1
-            OR
-              period2 = 1
-            OR 
-              period3 = 1
-            OR 
-              period4 =1)
           )"""
     params: tuple[str] = (date,)
     result: db_config.Result = db_config.execute_query(query, params)
     if not result.success:
         raise Exception("Failed to load available teachers from database.")
-    return result.data
+    return [TeacherRow(*row) for row in result.data]
 
 
 def current_week(day: str) -> list[str]:
@@ -237,6 +588,137 @@ def current_week(day: str) -> list[str]:
     return [weekstart_date, weekend_date]
 
 
+@profiling.profiled
+def load_day_snapshot(date: str) -> DaySnapshot:
+    """Read everything needed to schedule a date in one read transaction.
+
+    Every teacher, the day's absences, each teacher's on-call counts for the week and the
+    school year, and any schedule already saved for the day all come from the same
+    consistent view of the database. Inactive teachers are kept so their absences can
+    still be covered; DaySnapshot.available leaves them out."""
+    year: str = get_school_year(date)
+    week_start: str = current_week(date)[0]
+    with db_config.Transaction(immediate=False):
+        teachers = db_config.execute_query("SELECT * FROM teachers")
+        absences = db_config.execute_query(
+            f"SELECT {ABSENCE_COLUMNS} FROM unfilled_absences WHERE date = ?", (date,)
+        )
+        # both counts come from the maintained counters in one query
+        counts = db_config.execute_query(
+            """
+            SELECT
+                teacher_id,
+                SUM(CASE WHEN week_start = ? THEN count ELSE 0 END),
+                SUM(CASE WHEN year = ? THEN count ELSE 0 END)
+            FROM oncall_counts
+            WHERE year = ? OR week_start = ?
+            GROUP BY teacher_id
+            """,
+            (week_start, year, year, week_start),
+        )
+        schedule = db_config.execute_query(
+            """
+            SELECT absent_teacher_id, teacher_id, year, date, period, half
+            FROM oncall_schedule
+            WHERE date = ?
+            ORDER BY id
+            """,
+            (date,),
+        )
+    if not all(result.success for result in (teachers, absences, counts, schedule)):
+        raise Exception("Failed to load the day's snapshot from database.")
+    return DaySnapshot(
+        date=date,
+        year=year,
+        teachers=tuple(TeacherRow(*row) for row in teachers.data),
+        absences=tuple(Absence(*row) for row in absences.data),
+        week_counts=MappingProxyType({row[0]: row[1] for row in counts.data if row[1]}),
+        year_counts=MappingProxyType({row[0]: row[2] for row in counts.data if row[2]}),
+        schedule=tuple(tuple(row) for row in schedule.data),
+    )
+
+
+def get_weekly_oncall_counts(day: str) -> dict[int, int]:
+    """Get the number of on-calls each teacher has for the week of the given day."""
+    # read from the maintained counters; a week spanning two school years has two rows
+    query: str = """
+        SELECT teacher_id, SUM(count)
+        FROM oncall_counts
+        WHERE week_start = ?
+        GROUP BY teacher_id
+        """
+    params: tuple[str] = (current_week(day)[0],)
+    result: db_config.Result = db_config.execute_query(query, params)
+    if not result.success:
+        raise Exception("Failed to load weekly on-call counts from database.")
+    return {row[0]: row[1] for row in result.data}
+
+
+def get_teacher_oncall_counts(teacher_id: int, day: str) -> tuple[int, int]:
+    """Get one teacher's on-call count for the week and for the school year of the given day."""
+    query: str = """
+        SELECT
+            COALESCE(SUM(CASE WHEN week_start = ? THEN count ELSE 0 END), 0),
+            COALESCE(SUM(CASE WHEN year = ? THEN count ELSE 0 END), 0)
+        FROM oncall_counts
+        WHERE teacher_id = ? AND (year = ? OR week_start = ?)
+        """
+    week_start: str = current_week(day)[0]
+    year: str = get_school_year(day)
+    params: tuple = (week_start, year, teacher_id, year, week_start)
+    result: db_config.Result = db_config.execute_query(query, params)
+    if not result.success:
+        raise Exception("Failed to load on-call counts from database.")
+    return result.data[0][0], result.data[0][1]
+
+
+def get_daily_oncall_counts(start: str, end: str) -> dict[str, dict[int, int]]:
+    """Get the number of on-calls each teacher has on each day between start and end inclusive."""
+    query: str = """
+        SELECT date, teacher_id, COUNT(id)
+        FROM oncall_schedule
+        WHERE date BETWEEN ? AND ?
+        GROUP BY date, teacher_id
+        """
+    params: tuple[str, str] = (start, end)
+    result: db_config.Result = db_config.execute_query(query, params)
+    if not result.success:
+        raise Exception("Failed to load daily on-call counts from database.")
+    counts: dict[str, dict[int, int]] = {}
+    for day, teacher_id, total in result.data:
+        counts.setdefault(day, {})[teacher_id] = total
+    return counts
+
+
+def get_yearly_oncall_counts(years: list[str]) -> dict[str, dict[int, int]]:
+    """Get the number of on-calls each teacher has in each of the given school years."""
+    counts: dict[str, dict[int, int]] = {year: {} for year in years}
+    if not years:
+        return counts
+    query: str = f"""
+        SELECT year, teacher_id, SUM(count)
+        FROM oncall_counts
+        WHERE year IN ({", ".join("?" for _ in years)})
+        GROUP BY year, teacher_id
+        """
+    result: db_config.Result = db_config.execute_query(query, tuple(years))
+    if not result.success:
+        raise Exception("Failed to load yearly on-call counts from database.")
+    for year, teacher_id, total in result.data:
+        counts[year][teacher_id] = total
+    return counts
+
+
+def date_range(start: str, end: str) -> list[str]:
+    """Get every date from start to end inclusive in YYYYMMDD format."""
+    start_day: datetime = datetime.strptime(start, "%Y%m%d")
+    end_day: datetime = datetime.strptime(end, "%Y%m%d")
+    return [
+        (start_day + timedelta(offset)).strftime("%Y%m%d")
+        for offset in range((end_day - start_day).days + 1)
+    ]
+
+
 def get_school_year(given_date: str) -> str:
     """
     Returns the school year in the format "YYYY/YYYY" for a given date.
@@ -271,18 +753,28 @@ def split_available_teachers(available_teachers: list) -> list[list]:
 
 def get_unfilled_absences(date: str) -> list:
     """Returns a list of all unfilled absences listed for the current day"""
-    query: str = "SELECT * FROM unfilled_absences WHERE date = ?"
+    query: str = f"SELECT {ABSENCE_COLUMNS} FROM unfilled_absences WHERE date = ?"
     params: tuple[str] = (date,)
     result: db_config.Result = db_config.execute_query(query, params)
     if result.success:
-        return [
-            [row[0], row[1], row[2], row[3], row[4], row[5], row[6]]
-            for row in result.data
-        ]
+        return [Absence(*row) for row in result.data]
     else:
         raise Exception("Failed to load unfilled absences from database.")
 
 
+def get_unfilled_absences_between(start: str, end: str) -> dict[str, list]:
+    """Returns the unfilled absences for every day between start and end inclusive, by date"""
+    query: str = f"SELECT {ABSENCE_COLUMNS} FROM unfilled_absences WHERE date BETWEEN ? AND ?"
+    params: tuple[str, str] = (start, end)
+    result: db_config.Result = db_config.execute_query(query, params)
+    if not result.success:
+        raise Exception("Failed to load unfilled absences from database.")
+    absences: dict[str, list] = {}
+    for row in result.data:
+        absences.setdefault(row[1], []).append(Absence(*row))
+    return absences
+
+
 def add_names(data: list, lookup: dict) -> list:
     """Add the names to the data list"""
     for row in data:
@@ -290,6 +782,7 @@ def add_names(data: list, lookup: dict) -> list:
     return data
 
 
+@cached_read("teachers", copy=dict)
 def get_teacher_lookup() -> dict[int, str]:
     """Get a dictionary of teacher names and their ids"""
     query: str = "SELECT teacher_id, teacher_name FROM teachers"
@@ -304,13 +797,13 @@ def get_oncall_totals(year: str) -> list[list[str | int]]:
     """Get the total number of on-calls for each teacher in the given year."""
     query: str = """SELECT 
                 teachers.teacher_name, 
-                COUNT(oncall_schedule.id) AS total_oncalls
+                SUM(oncall_counts.count) AS total_oncalls
             FROM 
                 teachers
-            LEFT JOIN 
-                oncall_schedule ON teachers.teacher_id = oncall_schedule.teacher_id
+            JOIN 
+                oncall_counts ON teachers.teacher_id = oncall_counts.teacher_id
             WHERE 
-                oncall_schedule.year = ?
+                oncall_counts.year = ?
             GROUP BY 
                 teachers.teacher_name
         """
@@ -324,32 +817,96 @@ def get_oncall_totals(year: str) -> list[list[str | int]]:
 def save_oncall_schedule(schedule: list) -> None:
     """Save an on-call schedule entry to the database. overwrite existing entries.
     
-    The schedule should be a list of lists, where each inner list contains:
+    The schedule should be a list of lists, where each inner list ends with:
     [teacher_id: int, year: str, date: str, period: str, half: str]
+    Rows from OnCallSchedule.get_schedule also lead with the absent teacher's id, which is
+    stored too, so they can be passed directly.
+    The delete and insert are committed together as one transaction.
     """
-    date: str = schedule[0][2]  # Assuming the first entry has the date
-    query1: str = "DELETE FROM oncall_schedule WHERE date = ?"
-    params1: tuple[str] = (date,)
-    result1: db_config.Result = db_config.execute_query(query1, params1)
-    if not result1.success:
-        raise Exception("Failed to clear existing on-call schedule for the date.")
-        # Insert new entries into the on-call schedule
-    
     if not schedule:
         raise Exception("No schedule provided") 
-    
-    query2: str = """
-                INSERT INTO oncall_schedule (teacher_id, year, date, period, half)
-                VALUES (?, ?, ?, ?, ?)
+
+    date: str = schedule[0][-3]  # Assuming the first entry has the date
+    with db_config.Transaction():
+        delete_oncall_schedule(date)
+        # Insert new entries into the on-call schedule
+        insert_oncalls(schedule)
+        bump_generation("oncall_schedule")
+
+
+def delete_oncall_schedule(date: str) -> None:
+    """Remove every on-call saved for the date."""
+    query: str = "DELETE FROM oncall_schedule WHERE date = ?"
+    result: db_config.Result = db_config.execute_query(query, (date,))
+    if not result.success:
+        raise Exception("Failed to clear existing on-call schedule for the date.")
+    bump_generation("oncall_schedule")
+
+
+def insert_oncalls(oncalls: list) -> None:
+    """Insert on-call rows in the format accepted by save_oncall_schedule."""
+    if not oncalls:
+        return
+    query: str = """
+                INSERT INTO oncall_schedule (absent_teacher_id, teacher_id, year, date, period, half)
+                VALUES (?, ?, ?, ?, ?, ?)
             """
-    params2: List[tuple[str | int, str | int, str | int, str | int, str | int]] = []
-    for oncall in schedule:
-            params2.append((oncall[0],
-                oncall[1],
-                oncall[2],
-                oncall[3],
-                oncall[4]))
-    result2: db_config.Result = db_config.execute_query(query2, params2)
-    if not result2.success:
+    params: List[tuple] = []
+    for oncall in oncalls:
+        absent_teacher_id = oncall[0] if len(oncall) > 5 else None
+        params.append((absent_teacher_id, *oncall[-5:]))
+    result: db_config.Result = db_config.execute_query(query, params)
+    if not result.success:
         raise Exception("Failed to save on-call schedule to the database.")
-    
\ No newline at end of file
+
+
+def get_oncall_schedule(date: str) -> list:
+    """Get the saved on-call schedule for a date in the same format as OnCallSchedule.get_schedule:
+    absent teacher id, teacher id, year, date, period, half"""
+    query: str = """
+        SELECT absent_teacher_id, teacher_id, year, date, period, half
+        FROM oncall_schedule
+        WHERE date = ?
+        ORDER BY id
+        """
+    params: tuple[str] = (date,)
+    result: db_config.Result = db_config.execute_query(query, params)
+    if not result.success:
+        raise Exception("Failed to load on-call schedule from database.")
+    return [list(row) for row in result.data]
+
+
+def get_oncall_schedule_between(start: str, end: str) -> list:
+    """Get the saved on-call schedule for every day between start and end inclusive, in the
+    get_oncall_schedule format and in date order"""
+    query: str = """
+        SELECT absent_teacher_id, teacher_id, year, date, period, half
+        FROM oncall_schedule
+        WHERE date BETWEEN ? AND ?
+        ORDER BY date, id
+        """
+    params: tuple[str, str] = (start, end)
+    result: db_config.Result = db_config.execute_query(query, params)
+    if not result.success:
+        raise Exception("Failed to load on-call schedule from database.")
+    return [list(row) for row in result.data]
+
+
+@profiling.profiled
+def save_oncall_changes(added: list, removed: list) -> None:
+    """Persist only the on-calls that changed for a date, in one transaction.
+
+    Both lists hold rows in the OnCallSchedule.get_schedule format. Removed rows are matched
+    on teacher, date, period and half, the same fields that make two OnCalls equal."""
+    with db_config.Transaction():
+        if removed:
+            query: str = """
+                DELETE FROM oncall_schedule
+                WHERE teacher_id = ? AND date = ? AND period = ? AND half = ?
+                """
+            params: List[tuple] = [(row[-5], row[-3], row[-2], row[-1]) for row in removed]
+            result: db_config.Result = db_config.execute_query(query, params)
+            if not result.success:
+                raise Exception("Failed to remove on-calls from the database.")
+        insert_oncalls(added)
+        bump_generation("oncall_schedule")
@@ -0,0 +1,250 @@
+# This file contains the plain record types shared by the scheduling logic and the GUI.
+# It must not import wx, polars or any other oncall module.
+from typing import Mapping, NamedTuple
+
+
+def period_mask(*periods) -> int:
+    """Pack per-period flags into a bitmask; bit 0 is period 1, bit 1 period 2 and so on."""
+    mask: int = 0
+    for bit, value in enumerate(periods):
+        if value:
+            mask |= 1 << bit
+    return mask
+
+
+class TeacherRow(NamedTuple):
+    """A row of the teachers table."""
+    teacher_id: int
+    teacher_name: str
+    period1: str | None
+    period2: str | None
+    period3: str | None
+    period4: str | None
+    available: int | None
+    active: int
+
+
+class Absence(NamedTuple):
+    """A row of the unfilled_absences table."""
+    id: int
+    date: str
+    teacher_id: int
+    period1: int
+    period2: int
+    period3: int
+    period4: int
+
+    @property
+    def mask(self) -> int:
+        """Bitmask of the periods the teacher is absent."""
+        return period_mask(self.period1, self.period2, self.period3, self.period4)
+
+
+class FreePeriodPolicy:
+    """Decides which period a teacher is free for on-calls from the periods they teach.
+
+    A full time teacher (exactly one period without a class) is free that period. A part
+    time teacher is free in the period nearest their first class, preferring the rest of
+    that class's block (e.g. the AM or PM half of the day) before the other blocks. The
+    answer for every one of the 2**periods occupancy patterns is worked out once into a
+    table, so resolving a teacher is a single list lookup.
+    """
+
+    def __init__(self, periods: int = 4, blocks: tuple[tuple[int, ...], ...] = ((1, 2), (3, 4))):
+        self.periods = periods
+        self.blocks = blocks
+        self.table: list[int | None] = [self._resolve(mask) for mask in range(1 << periods)]
+
+    def block_of(self, period: int) -> int:
+        for index, block in enumerate(self.blocks):
+            if period in block:
+                return index
+        return -1
+
+    def _resolve(self, mask: int) -> int | None:
+        """Work out the free period for one occupancy bitmask."""
+        free: list[int] = [p for p in range(1, self.periods + 1) if not mask & (1 << (p - 1))]
+        if len(free) == 1:
+            return free[0]
+        if len(free) == self.periods or not free:
+            return None
+        first_class: int = next(p for p in range(1, self.periods + 1) if mask & (1 << (p - 1)))
+        block: int = self.block_of(first_class)
+        return min(free, key=lambda p: (self.block_of(p) != block, abs(p - first_class)))
+
+    def free_period(self, occupied: int) -> int | None:
+        """Return the free period for an occupancy bitmask as built by period_mask."""
+        return self.table[occupied]
+
+
+class DaySnapshot(NamedTuple):
+    """Everything needed to schedule one date, read in a single transaction.
+
+    Built by logic.load_day_snapshot. The fields are tuples and read-only mappings, so the
+    scheduler and the UI can share a snapshot safely."""
+    date: str
+    year: str
+    teachers: tuple[TeacherRow, ...]
+    absences: tuple[Absence, ...]
+    week_counts: Mapping[int, int]
+    year_counts: Mapping[int, int]
+    schedule: tuple[tuple, ...]
+
+    @property
+    def available(self) -> list[TeacherRow]:
+        """The active teachers without an absence on the date."""
+        absent: set[int] = {absence.teacher_id for absence in self.absences if absence.mask}
+        return [row for row in self.teachers if row.active and row.teacher_id not in absent]
+
+    @property
+    def lookup(self) -> dict[int, str]:
+        """Teacher names by id."""
+        return {row.teacher_id: row.teacher_name for row in self.teachers}
+
+
+class Teacher:
+    """Class to manage instances of a teacher in the context of creating the on call schedule"""
+
+    # swap for a FreePeriodPolicy built for a different day structure
+    free_period_policy: FreePeriodPolicy = FreePeriodPolicy()
+
+    # slotted, since history analysis and bulk imports hold a great many of these
+    __slots__ = (
+        "id",
+        "name",
+        "period1",
+        "period2",
+        "period3",
+        "period4",
+        "occupied",
+        "available",
+        "active",
+    )
+
+    def __init__(
+        self,
+        name,
+        period1=None,
+        period2=None,
+        period3=None,
+        period4=None,
+        oncalls=0,
+        available=None,
+        active=True,
+        id=None,
+    ):
+        self.id = id
+        self.name = name
+        self.period1 = period1
+        self.period2 = period2
+
+        self.period3 = period3
+        self.period4 = period4
+        # bitmask of the periods the teacher has a class
+        self.occupied = period_mask(period1, period2, period3, period4)
+        if available:
+            self.available = available
+        else:
+            self.available = self.find_available_period()
+        self.active = active
+
+    def find_available_period(self):
+        """Find the first available period for the teacher."""
+        return self.free_period_policy.free_period(self.occupied)
+
+    def __repr__(self):
+        return f"Teacher(name={self.name}: Free period={self.available})"
+
+
+class TeacherList:
+    """An indexed collection of teachers.
+
+    Alongside the ordered list, teachers are indexed by id and by name, bucketed by the
+    period they are free, and split into active and inactive sets. The indexes are kept in
+    step by add_teacher and remove_teacher, so every lookup is O(1).
+    """
+
+    def __init__(self):
+        self.teachers = []
+        self.by_id: dict[int, Teacher] = {}
+        self.by_name: dict[str, Teacher] = {}
+        self.by_period: dict[int | None, dict[int, Teacher]] = {}
+        self.active: dict[int, Teacher] = {}
+        self.inactive: dict[int, Teacher] = {}
+
+    def add_teacher(self, teacher):
+        self.teachers.append(teacher)
+        if teacher.id is not None:
+            self.by_id[teacher.id] = teacher
+        self.by_name[teacher.name] = teacher
+        # buckets and partitions are keyed by object identity so teachers without an id fit too
+        self.by_period.setdefault(teacher.available, {})[id(teacher)] = teacher
+        (self.active if teacher.active else self.inactive)[id(teacher)] = teacher
+
+    def remove_teacher(self, teacher):
+        self.teachers.remove(teacher)
+        if self.by_id.get(teacher.id) is teacher:
+            del self.by_id[teacher.id]
+        if self.by_name.get(teacher.name) is teacher:
+            del self.by_name[teacher.name]
+        self.by_period.get(teacher.available, {}).pop(id(teacher), None)
+        self.active.pop(id(teacher), None)
+        self.inactive.pop(id(teacher), None)
+
+    def get_teachers(self):
+        return self.teachers
+
+    def get_by_id(self, teacher_id: int) -> Teacher | None:
+        """Return the teacher with the given id, or None."""
+        return self.by_id.get(teacher_id)
+
+    def get_by_name(self, name: str) -> Teacher | None:
+        """Return the teacher with the given name, or None."""
+        return self.by_name.get(name)
+
+    def available_in(self, period: int | None) -> list[Teacher]:
+        """Return the teachers whose free period is the given period."""
+        return list(self.by_period.get(period, {}).values())
+
+    def get_active(self) -> list[Teacher]:
+        return list(self.active.values())
+
+    def get_inactive(self) -> list[Teacher]:
+        return list(self.inactive.values())
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.by_name
+
+    def __len__(self) -> int:
+        return len(self.teachers)
+
+    def __iter__(self):
+        # a fresh iterator each time, so nested loops over the same list work
+        return iter(self.teachers)
+
+
+class OnCall:
+    __slots__ = ("absent_teacher_id", "teacher_id", "date", "year", "period", "half")
+
+    def __init__(
+        self, absent_teacher_id, teacher_id: int, date: str, year: str, period: str, half: str
+    ) -> None:
+        self.absent_teacher_id = absent_teacher_id
+        self.teacher_id = teacher_id
+        self.date = date
+        self.year = year
+        self.period = period
+        self.half = half
+
+    def __eq__(self, other):
+        if not isinstance(other, OnCall):
+            return NotImplemented
+        return (
+            self.teacher_id == other.teacher_id
+            and self.date == other.date
+            and self.period == other.period
+            and self.half == other.half
+        )
+
+    def __repr__(self):
+        return f"OnCall({self.teacher_id}, {self.date}, {self.period}, {self.half})"
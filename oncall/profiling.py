@@ -0,0 +1,205 @@
+"""Lightweight timing spans for finding where scheduling and imports spend their time.
+
+Wrap a phase in `with profiling.span("name", "category"):` or decorate a function with
+@profiling.profiled. Spans nest, per thread. While profiling is off a span is a shared
+no-op context manager, so the hooks can stay in hot code.
+
+Categories split the time into database work ("db", recorded for every execute_query),
+reading timetable files ("excel") and everything else ("python"). Turn profiling on with
+the ONCALL_PROFILE environment variable, the --profile options of the command line, or
+Tools > Profiling in the app. Results come as a flat report (report) or a Chrome trace
+file (write_chrome_trace) that chrome://tracing or https://ui.perfetto.dev can open.
+ONCALL_PROFILE=1 prints the report when the program exits; ONCALL_PROFILE=trace.json
+writes the trace there instead.
+"""
+import atexit
+import contextlib
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from typing import Callable, Iterable, Iterator, NamedTuple, TextIO, TypeVar
+
+T = TypeVar("T")
+
+
+class SpanRecord(NamedTuple):
+    name: str
+    category: str
+    # seconds since the profiler started
+    start: float
+    elapsed: float
+    # elapsed less the time spent in spans nested inside this one
+    own: float
+    thread: int
+    depth: int
+
+
+class Profiler:
+    """Collects finished spans from every thread."""
+
+    def __init__(self):
+        self.started: float = time.perf_counter()
+        self.spans: list[SpanRecord] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str = "python") -> Iterator[None]:
+        # each open span on this thread keeps a running total of its children's time
+        stack: list[float] = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed: float = time.perf_counter() - start
+            nested: float = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            record = SpanRecord(
+                name,
+                category,
+                start - self.started,
+                elapsed,
+                elapsed - nested,
+                threading.get_ident(),
+                len(stack),
+            )
+            with self._lock:
+                self.spans.append(record)
+
+    def get_spans(self) -> list[SpanRecord]:
+        with self._lock:
+            return list(self.spans)
+
+    def report(self, file: TextIO | None = None, limit: int = 30) -> None:
+        """Print the time spent in each category, then the spans with the most total time.
+
+        Self time excludes nested spans, so the category totals add up to the time
+        profiled without counting anything twice."""
+        file = file or sys.stderr
+        spans: list[SpanRecord] = self.get_spans()
+        categories: dict[str, float] = {}
+        totals: dict[tuple[str, str], list] = {}
+        for record in spans:
+            categories[record.category] = categories.get(record.category, 0.0) + record.own
+            total = totals.setdefault((record.category, record.name), [0, 0.0, 0.0, 0.0])
+            total[0] += 1
+            total[1] += record.elapsed
+            total[2] += record.own
+            total[3] = max(total[3], record.elapsed)
+        print(f"{'self ms':>9}  category", file=file)
+        for category, own in sorted(categories.items(), key=lambda item: item[1], reverse=True):
+            print(f"{own * 1000:9.1f}  {category}", file=file)
+        print(f"{'calls':>6} {'total ms':>9} {'self ms':>9} {'max ms':>8}  span", file=file)
+        slowest = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+        for (category, name), (calls, elapsed, own, longest) in slowest[:limit]:
+            print(
+                f"{calls:6d} {elapsed * 1000:9.1f} {own * 1000:9.1f} {longest * 1000:8.1f}  "
+                f"{name} [{category}]",
+                file=file,
+            )
+
+    def chrome_trace(self) -> dict:
+        """The spans in Chrome's trace event format, as complete ("X") events."""
+        pid: int = os.getpid()
+        return {
+            "traceEvents": [
+                {
+                    "name": record.name,
+                    "cat": record.category,
+                    "ph": "X",
+                    "ts": record.start * 1e6,
+                    "dur": record.elapsed * 1e6,
+                    "pid": pid,
+                    "tid": record.thread,
+                }
+                for record in self.get_spans()
+            ],
+            "displayTimeUnit": "ms",
+        }
+
+    def write_chrome_trace(self, path: str) -> None:
+        with open(path, "w") as file:
+            json.dump(self.chrome_trace(), file)
+
+
+_profiler: Profiler | None = None
+# returned by span while profiling is off; nullcontext holds no state, so one is shared
+_NO_SPAN = contextlib.nullcontext()
+_DONE = object()
+
+
+def span(name: str, category: str = "python") -> contextlib.AbstractContextManager:
+    """Time the with block as a span when profiling, otherwise do nothing."""
+    if _profiler is None:
+        return _NO_SPAN
+    return _profiler.span(name, category)
+
+
+def profiled(func: Callable[..., T] | None = None, *, name: str | None = None, category: str = "python"):
+    """Decorator timing every call of a function as a span named after it."""
+    if func is None:
+        return functools.partial(profiled, name=name, category=category)
+    label: str = name or func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _profiler is None:
+            return func(*args, **kwargs)
+        with _profiler.span(label, category):
+            return func(*args, **kwargs)
+
+    return wrapper
+
+
+def iterate(items: Iterable[T], name: str, category: str = "python") -> Iterator[T]:
+    """Yield from items, timing the production of each item as a span.
+
+    For generators such as the timetable reader, where wrapping the loop in a span would
+    also count the time the caller spends on each item."""
+    iterator: Iterator[T] = iter(items)
+    while True:
+        with span(name, category):
+            item = next(iterator, _DONE)
+        if item is _DONE:
+            return
+        yield item
+
+
+def is_enabled() -> bool:
+    return _profiler is not None
+
+
+def enable() -> Profiler:
+    """Start profiling, keeping the spans already recorded if it is running."""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+    return _profiler
+
+
+def disable() -> Profiler | None:
+    """Stop profiling and return the profiler with what it recorded, if it was running."""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+def _finish_from_env(destination: str) -> None:
+    profiler: Profiler | None = disable()
+    if profiler is None:
+        return
+    if destination.endswith(".json"):
+        profiler.write_chrome_trace(destination)
+    else:
+        profiler.report()
+
+
+_env: str = os.environ.get("ONCALL_PROFILE", "")
+if _env not in ("", "0"):
+    enable()
+    atexit.register(_finish_from_env, _env)
@@ -0,0 +1,119 @@
+"""Helpers that keep start up fast: deferred imports and a start up profiling mode.
+
+Heavy modules (polars, fastexcel, wx.grid) are loaded with lazy_import so they are only
+imported when first used instead of before the first window appears. Start the app with
+--profile-startup (or ONCALL_PROFILE_STARTUP=1) to print how long each import took.
+"""
+import builtins
+import importlib.util
+import os
+import sys
+import threading
+import time
+from types import ModuleType
+from typing import TextIO
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Return the module called name, deferring its import until an attribute is first used.
+
+    A module that is already imported is returned as it is. The lazy module is registered
+    in sys.modules, so later plain imports of the same name share it."""
+    module: ModuleType | None = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None or spec.loader is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class ImportProfiler:
+    """Times every import made while it is installed.
+
+    Each module records its cumulative time (including the modules it imported in turn)
+    and its self time (excluding them), like python -X importtime."""
+
+    def __init__(self):
+        self.started: float = time.perf_counter()
+        self.timings: dict[str, tuple[float, float]] = {}
+        self.milestones: list[tuple[str, float]] = []
+        self._original = None
+        self._local = threading.local()
+
+    def install(self) -> None:
+        if self._original is None:
+            self._original = builtins.__import__
+            builtins.__import__ = self._import
+
+    def uninstall(self) -> None:
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original(name, globals, locals, fromlist, level)
+        stack: list[float] = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start: float = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed: float = time.perf_counter() - start
+            nested: float = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            self.timings.setdefault(name, (elapsed - nested, elapsed))
+
+    def mark(self, label: str) -> None:
+        """Record how long after profiling started a point of interest was reached."""
+        self.milestones.append((label, time.perf_counter() - self.started))
+
+    def report(self, file: TextIO | None = None, limit: int = 25) -> None:
+        """Print the slowest imports by cumulative time, then the milestones."""
+        file = file or sys.stderr
+        print(f"{'self ms':>9} {'cumul ms':>9}  module", file=file)
+        slowest = sorted(self.timings.items(), key=lambda item: item[1][1], reverse=True)
+        for name, (own, cumulative) in slowest[:limit]:
+            print(f"{own * 1000:9.1f} {cumulative * 1000:9.1f}  {name}", file=file)
+        for label, at in self.milestones:
+            print(f"{at * 1000:9.1f} ms  {label}", file=file)
+
+
+_profiler: ImportProfiler | None = None
+
+
+def profiling_requested(argv: list[str] | None = None) -> bool:
+    """True when --profile-startup is on the command line or ONCALL_PROFILE_STARTUP is set."""
+    argv = sys.argv if argv is None else argv
+    return "--profile-startup" in argv or os.environ.get("ONCALL_PROFILE_STARTUP", "") not in ("", "0")
+
+
+def start_profiling() -> ImportProfiler:
+    """Install the import profiler; call before the imports that should be timed."""
+    global _profiler
+    if _profiler is None:
+        _profiler = ImportProfiler()
+        _profiler.install()
+    return _profiler
+
+
+def mark(label: str) -> None:
+    """Record a start up milestone when profiling, otherwise do nothing."""
+    if _profiler is not None:
+        _profiler.mark(label)
+
+
+def finish_profiling(file: TextIO | None = None) -> None:
+    """Uninstall the profiler, if it is running, and print its report."""
+    global _profiler
+    if _profiler is not None:
+        _profiler.uninstall()
+        _profiler.report(file)
+        _profiler = None
@@ -0,0 +1,153 @@
+"""Run slow database, import and scheduling work off the UI thread.
+
+TaskExecutor runs functions on a small thread pool. Their results, errors and progress
+are handed to callbacks through a dispatch function; the GUI passes wx.CallAfter so the
+callbacks run on the main thread, while without one they run on the worker.
+
+Long running functions call report_progress and check_cancelled as they go. Both do
+nothing when called outside a task, so the same functions work from the command line.
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+_current = threading.local()
+
+
+class TaskCancelled(Exception):
+    """Raised inside a task by check_cancelled once the task has been cancelled."""
+
+
+def current_task() -> "Task | None":
+    """Return the task the calling thread is running, if any."""
+    return getattr(_current, "task", None)
+
+
+def report_progress(done: int, total: int | None = None, message: str = "") -> None:
+    """Report how far the current task has got; total is None when it is not known."""
+    task = current_task()
+    if task is not None:
+        task.report_progress(done, total, message)
+
+
+def check_cancelled() -> None:
+    """Raise TaskCancelled if the current task has been cancelled."""
+    task = current_task()
+    if task is not None and task.cancelled:
+        raise TaskCancelled()
+
+
+def call_directly(func: Callable, *args) -> None:
+    func(*args)
+
+
+class Task:
+    """Handle to work submitted to a TaskExecutor."""
+
+    def __init__(
+        self,
+        dispatch: Callable,
+        on_progress: Callable | None = None,
+        on_cancelled: Callable | None = None,
+    ):
+        self.future: Future | None = None
+        self._dispatch = dispatch
+        self._on_progress = on_progress
+        self._on_cancelled = on_cancelled
+        self._cancel = threading.Event()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self) -> None:
+        """Ask the task to stop. A task that has not started yet never runs; a running one
+        stops at its next check_cancelled, and whatever transaction it is in rolls back."""
+        self._cancel.set()
+        if self.future is not None and self.future.cancel() and self._on_cancelled:
+            self._dispatch(self._on_cancelled)
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    def result(self, timeout: float | None = None) -> Any:
+        """Wait for the task and return its result, re-raising any error it had no
+        on_error callback for."""
+        return self.future.result(timeout)
+
+    def report_progress(self, done: int, total: int | None = None, message: str = "") -> None:
+        if self._on_progress is not None:
+            self._dispatch(self._on_progress, done, total, message)
+
+
+class TaskExecutor:
+    """A thread pool whose task callbacks are run through dispatch."""
+
+    def __init__(self, max_workers: int = 2, dispatch: Callable | None = None):
+        self.dispatch: Callable = dispatch or call_directly
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="oncall-task")
+        self._tasks: set[Task] = set()
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        func: Callable,
+        *args,
+        on_success: Callable | None = None,
+        on_error: Callable | None = None,
+        on_progress: Callable | None = None,
+        on_cancelled: Callable | None = None,
+        **kwargs,
+    ) -> Task:
+        """Run func(*args, **kwargs) on a worker thread.
+
+        on_success gets the result, on_error the exception, on_progress the
+        (done, total, message) of each report_progress, and on_cancelled is called with no
+        arguments if the task is cancelled before it finishes. A task cancelled while running
+        never calls on_success, even if func returns without calling check_cancelled."""
+        task = Task(self.dispatch, on_progress, on_cancelled)
+        with self._lock:
+            self._tasks.add(task)
+        task.future = self._pool.submit(
+            self._run, task, func, args, kwargs, on_success, on_error, on_cancelled
+        )
+        task.future.add_done_callback(lambda future: self._forget(task))
+        return task
+
+    def _forget(self, task: Task) -> None:
+        with self._lock:
+            self._tasks.discard(task)
+
+    def _run(self, task, func, args, kwargs, on_success, on_error, on_cancelled):
+        _current.task = task
+        try:
+            check_cancelled()
+            result = func(*args, **kwargs)
+        except TaskCancelled:
+            if on_cancelled:
+                self.dispatch(on_cancelled)
+            return None
+        except Exception as e:
+            if on_error is None:
+                raise
+            self.dispatch(on_error, e)
+            return None
+        finally:
+            _current.task = None
+        if task.cancelled:
+            # the function never checked, so it ran to the end; its result was not wanted
+            if on_cancelled:
+                self.dispatch(on_cancelled)
+            return None
+        if on_success:
+            self.dispatch(on_success, result)
+        return result
+
+    def shutdown(self, cancel: bool = True, wait: bool = False) -> None:
+        """Stop accepting work; with cancel, pending and running tasks are cancelled too."""
+        if cancel:
+            with self._lock:
+                tasks = list(self._tasks)
+            for task in tasks:
+                task.cancel()
+        self._pool.shutdown(wait=wait, cancel_futures=cancel)
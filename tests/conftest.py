@@ -0,0 +1,21 @@
+import pytest
+from oncall import db_config, logic
+
+
+@pytest.fixture
+def tmp_cwd(tmp_path, monkeypatch):
+    """Run the test in an empty directory, so oncall.db is a fresh file there. The
+    default database path and the read cache are restored afterwards."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db_config, "DEFAULT_DB_PATH", db_config.DEFAULT_DB_PATH)
+    logic.clear_cache()
+    yield tmp_path
+    db_config.close_all_pools()
+    logic.clear_cache()
+
+
+@pytest.fixture
+def temp_db(tmp_cwd):
+    """A migrated, empty oncall.db in the test's own directory."""
+    db_config.initializeDB()
+    yield tmp_cwd
@@ -0,0 +1,21 @@
+from benchmarks import run, school
+
+
+def test_generate_school_is_seeded():
+    first = school.generate_school(teachers=30, history_years=1, seed=3)
+    assert first == school.generate_school(teachers=30, history_years=1, seed=3)
+    assert first != school.generate_school(teachers=30, history_years=1, seed=4)
+    assert len(first.timetable) == 30
+    assert list(first.days) == ["2022/2023", "2023/2024"]
+    assert {row[2] for row in first.history} == {"2022/2023"}
+    assert set(first.absences) == set(first.days["2023/2024"])
+    # every teacher teaches two or three periods
+    assert all(sum(1 for cell in row[1:] if cell and cell != "Lunch") in (2, 3) for row in first.timetable)
+
+
+def test_benchmark_scenarios_run(tmp_cwd):
+    generated = school.generate_school(teachers=20, history_years=1, seed=1)
+    bench = run.Bench(generated, tmp_cwd, timetable_format="csv")
+    results = bench.run(repeat=1)
+    assert [result.name for result in results] == [scenario.name for scenario in bench.scenarios()]
+    assert all(result.queries > 0 and result.best_ms > 0 for result in results)
@@ -0,0 +1,81 @@
+import pathlib
+import subprocess
+import sys
+import pytest
+from oncall import cli, logic
+
+
+@pytest.fixture
+def workdir(tmp_cwd):
+    # --db changes the default database path; tmp_cwd puts it back after each test
+    (tmp_cwd / "timetable.csv").write_text(
+        "Teacher,P1,P2,Lunch,P3,P4\n"
+        "alice,MATH,ENG,,,SCI\n"
+        "bob,,ENG2,,MATH2,SCI2\n"
+        "carol,HIST,,,GEO,ART\n"
+        "dave,A,B,,C,\n"
+    )
+    (tmp_cwd / "absences.csv").write_text(
+        "teacher,period1,period2,period3,period4\n"
+        "alice,x,,,\n"
+        "carol,1,1,1,1\n"
+    )
+    return tmp_cwd
+
+
+def test_parse_date():
+    assert cli.parse_date("2025-05-26") == "20250526"
+    assert cli.parse_date("20250526") == "20250526"
+    with pytest.raises(Exception):
+        cli.parse_date("26/05/2025")
+
+
+def test_cli_import_schedule_export(workdir, capsys):
+    assert cli.main(["--db", "cli.db", "import", "timetable.csv", "--dry-run"]) == 0
+    assert "Would import: 4 new" in capsys.readouterr().out
+    assert not (workdir / "oncall.db").exists()
+    assert cli.main(["--db", "cli.db", "import", "timetable.csv"]) == 0
+    assert cli.main(["--db", "cli.db", "absences", "absences.csv", "--date", "20250526"]) == 0
+    assert cli.main(["--db", "cli.db", "schedule", "--date", "20250526"]) == 0
+    assert "2 on-calls added, 0 removed" in capsys.readouterr().out
+    # running again keeps the saved schedule
+    assert cli.main(["--db", "cli.db", "schedule", "--date", "20250526"]) == 0
+    assert "0 on-calls added, 0 removed" in capsys.readouterr().out
+    assert cli.main(["--db", "cli.db", "export", "--date", "20250526", "-o", "out.csv"]) == 0
+    assert (workdir / "out.csv").read_text().splitlines() == [
+        "date,period,half,absent_teacher,oncall_teacher,year",
+        "20250526,period1,1st,alice,bob,2024/2025",
+        "20250526,period4,1st,carol,dave,2024/2025",
+    ]
+    assert not (workdir / "oncall.db").exists()
+
+
+def test_cli_absences_update_only_the_listed_teachers(workdir, capsys):
+    assert cli.main(["--db", "cli.db", "import", "timetable.csv"]) == 0
+    # bob's absence was entered in the app
+    lookup = {name: teacher_id for teacher_id, name in logic.get_teacher_lookup().items()}
+    logic.save_absence_changes("20250526", [[lookup["bob"], "bob", False, True, False, False, False]])
+    (workdir / "more.csv").write_text("teacher,period1,period2,period3,period4\nalice,x,,,\ncarol,,,,\n")
+    capsys.readouterr()
+    assert cli.main(["--db", "cli.db", "absences", "more.csv", "--date", "20250526"]) == 0
+    assert "20250526: saved 1 absences, cleared 1" in capsys.readouterr().out
+    absent = [row[1] for row in logic.get_absences_from_db("20250526") if any(row[2:6])]
+    assert absent == ["alice", "bob"]
+    assert cli.main(["--db", "cli.db", "absences", "more.csv", "--date", "20250526", "--replace"]) == 0
+    absent = [row[1] for row in logic.get_absences_from_db("20250526") if any(row[2:6])]
+    assert absent == ["alice"]
+
+
+def test_cli_reports_errors(workdir, capsys):
+    assert cli.main(["--db", "cli.db", "absences", "absences.csv", "--date", "20250526"]) == 1
+    assert "unknown teacher 'alice'" in capsys.readouterr().err
+    assert cli.main(["--db", "cli.db", "export", "--start", "20250530", "--end", "20250526"]) == 1
+
+
+def test_cli_does_not_import_wx():
+    code = (
+        "import sys, oncall.cli, oncall.helper_classes, oncall.logic; "
+        "sys.exit('wx' in sys.modules)"
+    )
+    root = pathlib.Path(__file__).parents[1]
+    assert subprocess.run([sys.executable, "-c", code], cwd=root).returncode == 0
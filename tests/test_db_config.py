@@ -0,0 +1,166 @@
+import sqlite3
+import threading
+import pytest
+from oncall import db_config
+
+
+def test_pool_reuses_connection_per_thread(tmp_path):
+    pool = db_config.ConnectionPool(str(tmp_path / "test.db"))
+    assert pool.get_connection() is pool.get_connection()
+
+    other: list = []
+    thread = threading.Thread(target=lambda: other.append(pool.get_connection()))
+    thread.start()
+    thread.join()
+    assert other[0] is not pool.get_connection()
+    pool.close_all()
+
+
+def test_pool_applies_pragmas(tmp_path):
+    pool = db_config.ConnectionPool(
+        str(tmp_path / "test.db"), journal_mode="WAL", synchronous="NORMAL"
+    )
+    conn = pool.get_connection()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    # NORMAL is reported as 1
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    pool.close_all()
+
+
+def test_database_connection_keeps_pooled_connection_open(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    with db_config.DatabaseConnection(db_path) as (conn, cursor):
+        cursor.execute("CREATE TABLE t (x INTEGER)")
+    with db_config.DatabaseConnection(db_path) as (conn2, cursor):
+        cursor.execute("SELECT * FROM t")
+        assert cursor.fetchall() == []
+    assert conn is conn2
+    db_config.close_all_pools()
+
+
+@pytest.fixture
+def table_t(tmp_cwd):
+    db_config.execute_query("CREATE TABLE t (x INTEGER)")
+
+
+def test_transaction_commits_once(table_t):
+    with db_config.Transaction():
+        db_config.execute_query("INSERT INTO t VALUES (?)", (1,))
+        with db_config.Transaction():
+            db_config.execute_query("INSERT INTO t VALUES (?)", [(2,), (3,)])
+        # the nested block joins the outer one, so nothing is committed yet
+        assert db_config.get_pool().get_connection().in_transaction
+    assert db_config.execute_query("SELECT x FROM t ORDER BY x").data == [(1,), (2,), (3,)]
+
+
+def test_transaction_rolls_back_on_error(table_t):
+    with pytest.raises(RuntimeError):
+        with db_config.Transaction():
+            db_config.execute_query("DELETE FROM t")
+            db_config.execute_query("INSERT INTO t VALUES (?)", (1,))
+            raise RuntimeError("failed half way")
+    assert db_config.execute_query("SELECT x FROM t").data == []
+
+
+@pytest.fixture
+def query_stats(monkeypatch):
+    stats = db_config.QueryStats(slow_query_ms=None)
+    monkeypatch.setattr(db_config, "query_stats", stats)
+    return stats
+
+
+def test_query_stats_by_call_site(table_t, query_stats):
+    db_config.execute_query("INSERT INTO t VALUES (?)", [(1,), (2,), (3,)])
+    db_config.execute_query("SELECT x FROM t")
+    db_config.execute_query("SELECT x FROM t", tag="report")
+    db_config.execute_query("SELECT missing FROM t")
+    stats = query_stats.get_stats()
+    site = f"{__name__}.test_query_stats_by_call_site"
+    assert stats[(site, "INSERT INTO t VALUES (?)")].rows == 3
+    assert stats[(site, "SELECT x FROM t")].calls == 1
+    assert stats[(site, "SELECT x FROM t")].rows == 3
+    assert stats[("report", "SELECT x FROM t")].calls == 1
+    assert stats[(site, "SELECT missing FROM t")].failures == 1
+    assert "report: SELECT x FROM t" in query_stats.summary()
+
+
+def test_slow_query_log_includes_plan(table_t, query_stats, caplog):
+    query_stats.slow_query_ms = 0
+    with caplog.at_level("WARNING", logger="oncall.db"):
+        db_config.execute_query("SELECT x FROM t WHERE x = ?", (1,))
+    assert "slow query" in caplog.text
+    assert "SCAN t" in caplog.text
+    assert query_stats.slow[-1].plan == ["SCAN t"]
+
+
+def test_query_stats_disabled(table_t, query_stats):
+    query_stats.enabled = False
+    db_config.execute_query("SELECT x FROM t")
+    assert query_stats.get_stats() == {}
+
+
+def test_apply_migrations(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    latest = max(version for version, _, _ in db_config.MIGRATIONS)
+    assert db_config.apply_migrations(db_path)[-1] == latest
+    assert db_config.get_schema_version(db_path) == latest
+    # running again is a no-op
+    assert db_config.apply_migrations(db_path) == []
+
+    conn = db_config.get_pool(db_path).get_connection()
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM unfilled_absences WHERE date = ?", ("20250101",)
+    ).fetchall()
+    assert "idx_unfilled_absences_date" in str(plan)
+    db_config.close_all_pools()
+
+
+def test_apply_migrations_upgrades_existing_database(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    db_config.apply_migrations(db_path, db_config.MIGRATIONS[:1])
+    assert db_config.get_schema_version(db_path) == 1
+    assert db_config.apply_migrations(db_path)[0] == 2
+    db_config.close_all_pools()
+
+
+def test_sparse_absences_migration(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    db_config.apply_migrations(db_path, db_config.MIGRATIONS[:4])
+    conn = db_config.get_pool(db_path).get_connection()
+    conn.executemany(
+        """INSERT INTO unfilled_absences (date, teacher_id, period1, period2, period3, period4)
+        VALUES (?, ?, ?, ?, ?, ?)""",
+        [
+            ("20250526", 1, 1, 0, 1, 0),
+            ("20250526", 2, 0, 0, 0, 0),  # not absent
+            ("20250526", 3, 1, 0, 0, 0),
+            ("20250526", 3, 0, 1, 1, 1),  # saved twice; the later row wins
+            ("20250527", 1, None, None, None, 1),
+        ],
+    )
+    conn.commit()
+    assert db_config.apply_migrations(db_path)[0] == 5
+    rows = conn.execute(
+        "SELECT date, teacher_id, periods FROM unfilled_absences ORDER BY date, teacher_id"
+    ).fetchall()
+    assert rows == [("20250526", 1, 0b0101), ("20250526", 3, 0b1110), ("20250527", 1, 0b1000)]
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute(
+            "INSERT INTO unfilled_absences (date, teacher_id, periods) VALUES ('20250526', 1, 2)"
+        )
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute(
+            "INSERT INTO unfilled_absences (date, teacher_id, periods) VALUES ('20250526', 2, 0)"
+        )
+    db_config.close_all_pools()
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [("", 200.0), ("50", 50.0), ("off", None), ("fast", 200.0)],
+)
+def test_slow_query_ms_from_env(monkeypatch, caplog, value, expected):
+    monkeypatch.setenv("ONCALL_SLOW_QUERY_MS", value)
+    with caplog.at_level("WARNING", logger="oncall.db"):
+        assert db_config._slow_query_ms_from_env() == expected
+    assert ("not a number" in caplog.text) == (value == "fast")
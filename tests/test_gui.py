@@ -0,0 +1,49 @@
+import pytest
+
+wx = pytest.importorskip("wx")
+from oncall import gui  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app():
+    try:
+        app = wx.App()
+    except SystemExit:
+        pytest.skip("no display available")
+    yield app
+    app.Destroy()
+
+
+@pytest.fixture
+def absences():
+    return [
+        [1, "teacher1", False, True, False, False, False],
+        [2, "teacher2", False, False, False, False, False],
+        [3, "teacher3", True, True, True, True, True],
+    ]
+
+
+def test_grid_attrs_are_shared(app, absences):
+    table = gui.CustomGridTable(absences, striped=True)
+    assert table.bool_cols == {2, 3, 4, 5, 6}
+    assert table.GetAttr(0, 2, 0) is table.GetAttr(2, 6, 0)
+    assert table.GetAttr(0, 1, 0) is table.GetAttr(2, 0, 0)
+    assert table.GetAttr(0, 2, 0) is not table.GetAttr(1, 2, 0)
+    assert table.GetAttr(0, 1, 0) is not table.GetAttr(0, 2, 0)
+    assert table.GetAttr(0, 1, 0).GetBackgroundColour() != table.GetAttr(1, 1, 0).GetBackgroundColour()
+
+
+def test_grid_unstriped(app, absences):
+    table = gui.CustomGridTable(absences)
+    assert table.GetAttr(0, 1, 0).GetBackgroundColour() == table.GetAttr(1, 1, 0).GetBackgroundColour()
+
+
+def test_grid_tracks_dirty_rows(app, absences):
+    table = gui.CustomGridTable(absences)
+    table.SetValue(0, 3, True)  # unchanged
+    assert table.get_dirty_rows() == []
+    table.set_row_values(1, range(2, 7), True)
+    table.SetValue(2, 2, False)
+    assert [row[0] for row in table.get_dirty_rows()] == [2, 3]
+    table.mark_clean()
+    assert table.get_dirty_rows() == []
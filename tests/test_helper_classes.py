@@ -1,6 +1,5 @@
 import pytest
-from unittest.mock import patch
-from oncall import helper_classes
+from oncall import db_config, helper_classes, logic
 
 
 mock_teachers = [
@@ -96,37 +95,44 @@ mock_teachers = [
     ],
 ]
 
-mock_absences = [
-    (1, "2025-05-26", 1, 1, 0, 0, 0),  # period1 only
-    (2, "2025-05-26", 2, 0, 1, 0, 0),  # period2 only
-]
+@pytest.fixture
+def oncall_instance():
+    return helper_classes.OnCall(1, 5, "20250526", "2024/2025", "period1", "1st")
 
 
 @pytest.fixture
-def oncall_instance():
-    return helper_classes.OnCall(5, "20250526", "2024/2025", "period1", "1st")
+def teachers_db(temp_db):
+    db_config.execute_query(
+        "INSERT INTO teachers (teacher_id, teacher_name, period1, period2, period3, period4, available) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [tuple(row[:7]) for row in mock_teachers],
+    )
 
 
 @pytest.fixture
-def oncall_schedule_instance():
+def oncall_schedule_instance(teachers_db):
     return helper_classes.OnCallSchedule("20250526")
 
 
-@patch("oncall.helper_classes.logic.get_unfilled_absences", return_value=mock_absences)
-@patch("oncall.helper_classes.logic.get_available_teachers", return_value=mock_teachers)
-@patch("oncall.helper_classes.logic.get_school_year", return_value="2024/2025")
-def test_schedule_oncalls(mock_year, mock_teachers_func, mock_absences_func):
+def test_schedule_oncalls(teachers_db):
+    # teacher1 is away period 1 and teacher3 period 2, both periods they teach
+    logic.save_absences_to_db(
+        "20250526",
+        [
+            [1, "teacher1", True, False, False, False, True],
+            [3, "teacher3", False, True, False, False, False],
+        ],
+    )
     instance = helper_classes.OnCallSchedule("20250526")
-    instance.schedule_oncalls()
-    assert instance.unfilled_absences == [
-        (1, "2025-05-26", 1, 1, 0, 0, 0),  # period1 only
-        (2, "2025-05-26", 2, 0, 1, 0, 0),  # period2 only
+    assert instance.schedule_oncalls() == 0
+    assert [(row[2], tuple(row[3:7])) for row in instance.unfilled_absences] == [
+        (1, (True, False, False, False)),
+        (3, (False, True, False, False)),
     ]
     assert instance.get_schedule() == [
-        [2, "20250526", "period1", "1st"],
-        [6, "20250526", "period1", "2nd"],
-        [7, "20250526", "period2", "1st"],
-        [8, "20250526", "period2", "2nd"],
+        [1, 2, "2024/2025", "20250526", "period1", "1st"],
+        [1, 6, "2024/2025", "20250526", "period1", "2nd"],
+        [3, 7, "2024/2025", "20250526", "period2", "1st"],
+        [3, 8, "2024/2025", "20250526", "period2", "2nd"],
     ]
 
 
@@ -144,3 +150,207 @@ def test_remove_oncall(
 ):
     oncall_schedule_instance.add_oncall(oncall_instance)
     assert oncall_schedule_instance.remove_oncall(oncall_instance) == 0
+    assert oncall_schedule_instance.remove_oncall(oncall_instance) == 1
+
+
+def test_assigner_prefers_least_loaded():
+    assigner = helper_classes.OnCallAssigner(
+        mock_teachers, week_counts={2: 1}, year_counts={6: 3, 7: 5}
+    )
+    # teacher2 already has an on-call this week, so teacher6 goes first
+    assert assigner.next_teacher(1)[0] == 6
+    assert assigner.next_teacher(1)[0] == 2
+    assert assigner.next_teacher(1) is None
+    # teacher8 has fewer on-calls this year than teacher7
+    assert assigner.next_teacher(2)[0] == 8
+
+
+def test_assigner_respects_maximums():
+    assigner = helper_classes.OnCallAssigner(
+        mock_teachers,
+        week_counts={2: 2},
+        year_counts={7: 10},
+        max_per_week=2,
+        max_per_year=10,
+    )
+    assert assigner.remaining(1) == 1
+    assert assigner.next_teacher(1)[0] == 6
+    assert assigner.next_teacher(2)[0] == 8
+    assert assigner.next_teacher(2) is None
+
+
+def test_range_schedule_balances_across_days(teachers_db):
+    # teacher3 is away period 1 on Monday and Tuesday; only teacher2 and teacher6 are free then
+    logic.save_absences_to_db("20250526", [[3, "teacher3", True, False, False, False, False]])
+    logic.save_absences_to_db("20250527", [[3, "teacher3", True, False, False, False, False]])
+    logic.save_oncall_schedule([[9, 2, "2024/2025", "20250523", "period1", "1st"]])
+    schedule = helper_classes.OnCallRangeSchedule("20250526", "20250527")
+    assert schedule.schedule_oncalls() == 0
+    monday = schedule.schedules["20250526"].get_schedule()
+    tuesday = schedule.schedules["20250527"].get_schedule()
+    assert [row[1] for row in monday] == [6, 2]
+    assert [row[1] for row in tuesday] == [6, 2]
+    # Monday's on-calls are carried into Tuesday's weekly counts, which tie, so
+    # teacher2's on-call from the previous Friday puts teacher6 first again
+    assert schedule.week_counts("20250527") == {6: 2, 2: 2}
+    schedule.save()
+    assert logic.get_daily_oncall_counts("20250526", "20250527") == {
+        "20250526": {2: 1, 6: 1},
+        "20250527": {2: 1, 6: 1},
+    }
+
+
+def test_reschedule_keeps_announced_oncalls(teachers_db):
+    logic.save_absences_to_db("20250526", [[3, "teacher3", True, False, False, False, False]])
+    schedule = helper_classes.OnCallSchedule("20250526")
+    added, removed = schedule.reschedule()
+    assert [row[1] for row in added] == [2, 6] and removed == []
+    logic.save_oncall_changes(added, removed)
+
+    # a late call: teacher4 is away period 3, and teacher6 (on call period 1) is now away too
+    logic.save_absences_to_db(
+        "20250526",
+        [
+            [3, "teacher3", True, False, False, False, False],
+            [4, "teacher4", False, False, True, False, False],
+            [6, "teacher6", False, False, False, True, False],
+        ],
+    )
+    schedule = helper_classes.OnCallSchedule("20250526")
+    added, removed = schedule.reschedule()
+    assert [row[1] for row in removed] == [6]
+    assert [(row[1], row[4], row[5]) for row in added] == [
+        (1, "period3", "1st"),
+        (9, "period3", "2nd"),
+        (5, "period4", "1st"),
+    ]
+    # teacher2 keeps their slot, but nobody else is free to replace teacher6 in period 1
+    assert schedule.uncovered == [(3, 1, "2nd"), (6, 4, "2nd")]
+    logic.save_oncall_changes(added, removed)
+    assert sorted(row[1] for row in logic.get_oncall_schedule("20250526")) == [1, 2, 5, 9]
+
+
+def test_teacher_list_indexes():
+    teacher_list = helper_classes.TeacherList()
+    for row in mock_teachers:
+        teacher_list.add_teacher(
+            helper_classes.Teacher(
+                row[1], *(period or None for period in row[2:6]), id=row[0], active=row[0] != 9
+            )
+        )
+    assert teacher_list.get_by_id(7).name == "teacher7"
+    assert teacher_list.get_by_name("teacher2").id == 2
+    assert "teacher5" in teacher_list
+    assert [t.id for t in teacher_list.available_in(1)] == [2, 6]
+    assert [t.id for t in teacher_list.get_inactive()] == [9]
+
+    teacher_list.remove_teacher(teacher_list.get_by_id(6))
+    assert teacher_list.get_by_id(6) is None
+    assert "teacher6" not in teacher_list
+    assert [t.id for t in teacher_list.available_in(1)] == [2]
+    assert len(teacher_list) == 8
+    # iterating is not stateful, so nested loops see every teacher
+    assert sum(1 for _ in teacher_list for _ in teacher_list) == 64
+
+
+def test_compact_records():
+    teacher = helper_classes.Teacher("teacher4", "Literacy", None, "CHA3UE-01", "CHC2DE-02")
+    assert not hasattr(teacher, "__dict__")
+    assert teacher.occupied == 0b1101
+    assert not hasattr(helper_classes.OnCall(1, 2, "20250526", "2024/2025", "period1", "1st"), "__dict__")
+    row = (2, "20250526", 2, 0, 1, 0, 0)
+    absence = helper_classes.Absence(*row)
+    assert absence.mask == 0b0010
+    assert absence == row
+
+
+def test_free_period_policy():
+    policy = helper_classes.FreePeriodPolicy()
+    assert policy.free_period(0b1011) == 3  # full time, free period 3
+    assert policy.free_period(0b0001) == 2  # part time mornings
+    assert policy.free_period(0b0100) == 4  # part time afternoons
+    assert policy.free_period(0b1111) is None
+    assert policy.free_period(0b0000) is None
+    # a six period day split into three blocks
+    six = helper_classes.FreePeriodPolicy(6, ((1, 2), (3, 4), (5, 6)))
+    assert six.free_period(0b011111) == 6
+    assert six.free_period(0b000100) == 4
+
+
+def test_schedule_from_snapshot_matches_queries(teachers_db):
+    logic.save_absences_to_db("20250526", [[3, "teacher3", True, False, True, False, False]])
+    logic.save_oncall_schedule([[3, 7, "2024/2025", "20250526", "period2", "1st"]])
+    expected = helper_classes.OnCallSchedule("20250526")
+    expected_changes = expected.reschedule()
+    snapshot = logic.load_day_snapshot("20250526")
+    schedule = helper_classes.OnCallSchedule.from_snapshot(snapshot)
+    assert schedule.reschedule() == expected_changes
+    assert schedule.get_schedule() == expected.get_schedule()
+    assert snapshot.lookup[7] == "teacher7"
+
+
+def test_rescheduling_ignores_the_days_own_oncalls_for_caps(teachers_db):
+    # teacher3 is away period 1; teacher2 and teacher6 covered it when the day was first
+    # scheduled, so replacing that schedule must not count those on-calls against them
+    logic.save_absences_to_db("20250526", [[3, "teacher3", True, False, False, False, False]])
+    logic.save_oncall_schedule(
+        [
+            [3, 2, "2024/2025", "20250526", "period1", "1st"],
+            [3, 6, "2024/2025", "20250526", "period1", "2nd"],
+        ]
+    )
+    logic.save_oncall_schedule([[3, 6, "2024/2025", "20250527", "period1", "1st"]])
+    for schedule in (
+        helper_classes.OnCallSchedule("20250526", max_per_week=2),
+        helper_classes.OnCallSchedule.from_snapshot(logic.load_day_snapshot("20250526"), max_per_week=2),
+    ):
+        assert schedule.assigner.week_counts == {6: 1}
+        assert schedule.schedule_oncalls() == 0
+        assert [row[1] for row in schedule.get_schedule()] == [2, 6]
+
+
+def test_range_save_clears_days_left_without_oncalls(teachers_db):
+    logic.save_oncall_schedule([[3, 2, "2024/2025", "20250526", "period1", "1st"]])
+    # teacher3's absence was withdrawn, so Monday now needs no on-calls
+    schedule = helper_classes.OnCallRangeSchedule("20250526", "20250527")
+    schedule.schedule_oncalls()
+    schedule.save()
+    assert logic.get_oncall_schedule("20250526") == []
+    assert logic.get_weekly_oncall_counts("20250526") == {}
+
+
+def test_range_week_counts_include_later_days_of_the_week(teachers_db):
+    logic.save_absences_to_db("20250526", [[3, "teacher3", True, False, False, False, False]])
+    logic.save_oncall_schedule([[3, 6, "2024/2025", "20250528", "period1", "1st"]])
+    schedule = helper_classes.OnCallRangeSchedule("20250526", "20250526", max_per_week=1)
+    assert schedule.week_counts("20250526") == {6: 1}
+    schedule.schedule_oncalls()
+    assert [row[1] for row in schedule.get_schedule()] == [2]
+
+
+def test_inactive_teachers_are_not_given_oncalls(teachers_db):
+    db_config.execute_query("UPDATE teachers SET active = 0 WHERE teacher_id = 2")
+    logic.save_absences_to_db("20250526", [[3, "teacher3", True, False, False, False, False]])
+    single = helper_classes.OnCallSchedule("20250526")
+    single.schedule_oncalls()
+    snapshot = helper_classes.OnCallSchedule.from_snapshot(logic.load_day_snapshot("20250526"))
+    snapshot.schedule_oncalls()
+    ranged = helper_classes.OnCallRangeSchedule("20250526", "20250526")
+    ranged.schedule_oncalls()
+    # teacher6 is the only active teacher free in period 1
+    for schedule in (single.get_schedule(), snapshot.get_schedule(), ranged.get_schedule()):
+        assert [row[1] for row in schedule] == [6]
+
+
+def test_inactive_teachers_absences_are_still_covered(teachers_db):
+    db_config.execute_query("UPDATE teachers SET active = 0 WHERE teacher_id = 3")
+    logic.save_absences_to_db("20250526", [[3, "teacher3", True, False, False, False, False]])
+    snapshot = logic.load_day_snapshot("20250526")
+    assert 3 not in [row.teacher_id for row in snapshot.available]
+    assert snapshot.lookup[3] == "teacher3"
+    schedule = helper_classes.OnCallSchedule.from_snapshot(snapshot)
+    assert schedule.schedule_oncalls() == 0
+    expected = helper_classes.OnCallSchedule("20250526")
+    expected.schedule_oncalls()
+    assert schedule.get_schedule() == expected.get_schedule()
+    assert [row[0] for row in schedule.get_schedule()] == [3, 3]
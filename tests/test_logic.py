@@ -1,5 +1,10 @@
+import concurrent.futures
+import itertools
+import sqlite3
+import polars as pl
 import pytest
-from oncall import logic
+from oncall import db_config, logic
+from oncall.helper_classes import Teacher
 
 
 def test_get_school_year():
@@ -224,3 +229,322 @@ def test_add_names():
     assert result[1][0] == "teacher2"
     assert result[2][0] == "teacher3"
     assert result[3][0] == "teacher4"
+
+
+def test_get_weekly_oncall_counts(temp_db):
+    # 20250526 is a Monday, so the week runs 20250525 to 20250531
+    logic.save_oncall_schedule(
+        [
+            [9, 1, "2024/2025", "20250526", "period1", "1st"],
+            [9, 2, "2024/2025", "20250526", "period1", "2nd"],
+        ]
+    )
+    logic.save_oncall_schedule([[9, 1, "2024/2025", "20250530", "period2", "1st"]])
+    logic.save_oncall_schedule([[9, 1, "2024/2025", "20250602", "period2", "1st"]])
+    assert logic.get_weekly_oncall_counts("20250528") == {1: 2, 2: 1}
+
+
+def test_date_range():
+    assert logic.date_range("20250830", "20250902") == [
+        "20250830",
+        "20250831",
+        "20250901",
+        "20250902",
+    ]
+    assert logic.date_range("20250902", "20250901") == []
+
+
+def test_free_period_expr():
+    patterns = list(itertools.product([None, "class"], repeat=4))
+    frame = pl.DataFrame(
+        {f"period{i + 1}": [pattern[i] for pattern in patterns] for i in range(4)},
+        schema={f"period{i + 1}": pl.Utf8 for i in range(4)},
+    )
+    result = frame.select(available=logic.free_period_expr(frame.columns))
+    assert result["available"].to_list() == [
+        Teacher("name", *pattern).available for pattern in patterns
+    ]
+
+
+@pytest.fixture
+def timetable():
+    # the fourth column of an export is not a period
+    return pl.DataFrame(
+        {
+            "Teacher": ["teacher1", "teacher2", None, "teacher10", "teacher1"],
+            "P1": ["MFM2PE-02 (S-202) ", "", "x", "KPPDNE-02", "ignored duplicate"],
+            "P2": ["PPL1OE-04 (GYM) ", "TMJ2OE-02 (T-101) ", "x", None, None],
+            "Lunch": [None, None, None, None, None],
+            "P3": [None, "TMJ3/4CE-02 (T-101)", "x", None, None],
+            "P4": ["PPL1/2/3/4OE-02 (GYM)", "TIJ1OE-02  (T-101)  ", "x", None, None],
+        }
+    )
+
+
+def test_normalize_schedule(timetable):
+    result = logic.normalize_schedule(timetable)
+    assert result.rows() == [
+        ("teacher1", "MFM2PE-02 (S-202)", "PPL1OE-04 (GYM)", None, "PPL1/2/3/4OE-02 (GYM)", 3),
+        ("teacher2", None, "TMJ2OE-02 (T-101)", "TMJ3/4CE-02 (T-101)", "TIJ1OE-02  (T-101)", 1),
+        ("teacher10", "KPPDNE-02", None, None, None, 2),
+    ]
+
+
+def test_load_schedule_from_file(temp_db, timetable):
+    db_config.execute_query(
+        "INSERT INTO teachers (teacher_name) VALUES (?)", [("teacher1",), ("teacher3",)]
+    )
+    timetable.write_csv("timetable.csv")
+    results = logic.load_schedule_from_file("timetable.csv")
+    assert results["updated_teachers"]["teacher_name"].to_list() == ["teacher1"]
+    assert results["new_teachers"]["teacher_name"].to_list() == ["teacher2", "teacher10"]
+    assert results["inactive_teachers"]["teacher_name"].to_list() == ["teacher3"]
+    assert results["unchanged_teachers"].is_empty()
+
+    logic.handle_new_teachers(results["new_teachers"])
+    logic.handle_updated_teachers(results["updated_teachers"])
+    logic.handle_inactive_teachers(results["inactive_teachers"])
+    rows = db_config.execute_query(
+        "SELECT teacher_name, available, active FROM teachers ORDER BY teacher_id"
+    ).data
+    assert rows == [("teacher1", 3, 1), ("teacher3", None, 0), ("teacher2", 1, 1), ("teacher10", 2, 1)]
+
+
+def test_reimport_only_reports_changes(temp_db, timetable):
+    timetable.write_csv("timetable.csv")
+    results = logic.load_schedule_from_file("timetable.csv")
+    logic.handle_new_teachers(results["new_teachers"])
+    db_config.execute_query("INSERT INTO teachers (teacher_name, active) VALUES ('teacher3', 0)")
+
+    # teacher2 drops period 3 and teacher10 leaves
+    changed = timetable.with_columns(
+        pl.when(pl.col("Teacher") == "teacher2").then(None).otherwise(pl.col("P3")).alias("P3")
+    ).filter(pl.col("Teacher") != "teacher10")
+    changed.write_csv("timetable.csv")
+    results = logic.load_schedule_from_file("timetable.csv")
+    assert results["new_teachers"].is_empty()
+    assert results["updated_teachers"]["teacher_name"].to_list() == ["teacher2"]
+    # teacher3 is already inactive, so only teacher10 is deactivated
+    assert results["inactive_teachers"]["teacher_name"].to_list() == ["teacher10"]
+    assert results["unchanged_teachers"]["teacher_name"].to_list() == ["teacher1"]
+    assert logic.summarize_import(results) == (
+        "0 new\n1 updated: teacher2\n1 deactivated: teacher10\n1 unchanged"
+    )
+
+
+def test_import_schedule_streaming(temp_db, timetable):
+    db_config.execute_query(
+        "INSERT INTO teachers (teacher_name) VALUES (?)", [("teacher1",), ("teacher3",)]
+    )
+    timetable.write_csv("timetable.csv")
+    expected = {
+        "new_teachers": 2,
+        "updated_teachers": 1,
+        "inactive_teachers": 1,
+        "unchanged_teachers": 0,
+    }
+    assert logic.import_schedule_streaming("timetable.csv", batch_size=2, dry_run=True) == expected
+    assert logic.load_existing_teachers_frame().height == 2
+    # batches of two rows put teacher1's duplicate row in a later batch
+    assert logic.import_schedule_streaming("timetable.csv", batch_size=2) == expected
+    rows = db_config.execute_query(
+        "SELECT teacher_name, period1, available, active FROM teachers ORDER BY teacher_id"
+    ).data
+    assert rows == [
+        ("teacher1", "MFM2PE-02 (S-202)", 3, 1),
+        ("teacher3", None, None, 0),
+        ("teacher2", None, 1, 1),
+        ("teacher10", "KPPDNE-02", 2, 1),
+    ]
+
+
+def test_read_schedule_batches_parses_each_sheet_once(monkeypatch):
+    loads = []
+
+    class Sheet:
+        def __init__(self, frame):
+            self.frame = frame
+
+        def to_polars(self):
+            return self.frame
+
+    class Workbook:
+        sheet_names = ["Campus 1", "Campus 2"]
+
+        def load_sheet(self, name, **options):
+            loads.append((name, options))
+            rows = 5 if name == "Campus 1" else 2
+            return Sheet(pl.DataFrame({"Teacher": [f"{name} {n}" for n in range(rows)]}))
+
+    monkeypatch.setattr(logic, "fastexcel", type("fastexcel", (), {"read_excel": lambda path: Workbook()}))
+    batches = list(logic.read_schedule_batches("timetable.xlsx", 2))
+    assert [batch.height for batch in batches] == [2, 2, 1, 2]
+    assert loads == [("Campus 1", {}), ("Campus 2", {})]
+    assert [batch.height for batch in logic.read_schedule_batches("timetable.xlsx")] == [5, 2]
+
+
+def test_read_schedule_batches_allows_repeated_csv_headers(tmp_cwd):
+    with open("timetable.csv", "w") as handle:
+        handle.write("Teacher,P1,P2,,P3,P4,\nteacher1,A,,,B,C,\nteacher2,,D\n")
+    batches = list(logic.read_schedule_batches("timetable.csv", 1))
+    assert [batch.shape for batch in batches] == [(1, 7), (1, 7)]
+    schedule = logic.normalize_schedule(pl.concat(batches))
+    assert schedule.select("teacher_name", "period1", "period3", "period4").rows() == [
+        ("teacher1", "A", "B", "C"),
+        ("teacher2", None, None, None),
+    ]
+
+
+def test_load_schedule_reads_the_file_once(temp_db, timetable, monkeypatch):
+    timetable.write_csv("timetable.csv")
+    reads, progress = [], []
+    read_schedule_batches = logic.read_schedule_batches
+
+    def read(path, batch_size=None):
+        reads.append(batch_size)
+        return read_schedule_batches(path, batch_size)
+
+    monkeypatch.setattr(logic, "read_schedule_batches", read)
+    monkeypatch.setattr(logic, "IMPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(logic.tasks, "report_progress", lambda done, total=None, message="": progress.append(done))
+    results = logic.load_schedule_from_file("timetable.csv")
+    assert reads == [None]
+    assert progress == [2, 4, 5]
+    assert results["new_teachers"].height == 3
+
+
+def test_cached_reads_refresh_after_writes(temp_db, timetable):
+    timetable.write_csv("timetable.csv")
+    results = logic.load_schedule_from_file("timetable.csv")
+    assert logic.get_teacher_lookup() == {}
+    logic.handle_new_teachers(results["new_teachers"])
+    lookup = logic.get_teacher_lookup()
+    assert sorted(lookup.values()) == ["teacher1", "teacher10", "teacher2"]
+
+    absences = logic.get_absences_from_db("20250526")
+    absences[0][2] = True  # editing the returned rows leaves the cache alone
+    assert logic.get_absences_from_db("20250526")[0][2] is False
+    assert logic.load_teacher_list_from_db() is logic.load_teacher_list_from_db()
+
+    logic.save_absences_to_db("20250526", absences)
+    assert logic.get_absences_from_db("20250526")[0][2] is True
+    assert len(logic.get_available_teachers("20250526")) == 2
+
+
+def test_cached_reads_see_other_connections_on_every_thread(temp_db):
+    db_config.execute_query("INSERT INTO teachers (teacher_id, teacher_name) VALUES (1, 'a')")
+    worker = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    try:
+        assert logic.get_teacher_lookup() == {1: "a"}
+        # another process (e.g. the command line) commits behind the cache's back
+        other = sqlite3.connect(db_config.resolve_db_path())
+        other.execute("INSERT INTO teachers (teacher_id, teacher_name) VALUES (2, 'b')")
+        other.commit()
+        other.close()
+        # the worker's connection opens after the commit, so its data_version alone
+        # cannot tell that the main thread's cached read is stale
+        assert worker.submit(logic.get_teacher_lookup).result() == {1: "a", 2: "b"}
+        assert logic.get_teacher_lookup() == {1: "a", 2: "b"}
+    finally:
+        worker.shutdown()
+
+
+def test_cached_reads_refresh_after_another_threads_commit(temp_db):
+    db_config.execute_query("INSERT INTO teachers (teacher_id, teacher_name) VALUES (1, 'a')")
+    worker = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    try:
+        # both threads have read once, so neither connection counts as a change below
+        assert logic.get_teacher_lookup() == {1: "a"}
+        assert worker.submit(logic.get_teacher_lookup).result() == {1: "a"}
+        with db_config.Transaction():
+            db_config.execute_query("INSERT INTO teachers (teacher_id, teacher_name) VALUES (2, 'b')")
+            logic.bump_generation("teachers")
+            # the worker still sees the old rows and caches them under the new generation
+            assert worker.submit(logic.get_teacher_lookup).result() == {1: "a"}
+        assert logic.get_teacher_lookup() == {1: "a", 2: "b"}
+        assert worker.submit(logic.get_teacher_lookup).result() == {1: "a", 2: "b"}
+    finally:
+        worker.shutdown()
+
+
+def test_save_absence_changes(temp_db):
+    db_config.execute_query(
+        "INSERT INTO teachers (teacher_id, teacher_name, active) VALUES (?, ?, ?)",
+        [(1, "teacher1", 1), (2, "teacher2", 1), (3, "teacher3", 1)],
+    )
+    logic.save_absences_to_db(
+        "20250526",
+        [
+            [1, "teacher1", True, False, False, False, False],
+            [2, "teacher2", False, False, False, False, False],
+            [3, "teacher3", False, True, False, False, False],
+        ],
+    )
+    stored = "SELECT teacher_id, periods FROM unfilled_absences ORDER BY teacher_id"
+    assert db_config.execute_query(stored).data == [(1, 1), (3, 2)]
+    logic.save_absence_changes(
+        "20250526",
+        [[1, "teacher1", False, False, False, False, False], [2, "teacher2", False, True, False, False, False]],
+    )
+    assert db_config.execute_query(stored).data == [(2, 2), (3, 2)]
+    assert [row[3] for row in logic.get_absences_from_db("20250526")] == [False, True, True]
+    logic.save_absence_changes("20250526", [])
+    assert db_config.execute_query(stored).data == [(2, 2), (3, 2)]
+
+
+def test_load_day_snapshot(temp_db):
+    db_config.execute_query(
+        "INSERT INTO teachers (teacher_id, teacher_name, period1, available, active) VALUES (?, ?, ?, ?, ?)",
+        [(1, "teacher1", "x", 2, 1), (2, "teacher2", "x", 2, 1), (3, "teacher3", "x", 2, 0)],
+    )
+    logic.save_absences_to_db(
+        "20250528",
+        [[1, "teacher1", True, False, False, False, False], [2, "teacher2", False, False, False, False, False]],
+    )
+    logic.save_oncall_schedule([[9, 2, "2024/2025", "20250528", "period2", "1st"]])
+    logic.save_oncall_schedule([[9, 2, "2024/2025", "20250301", "period2", "1st"]])
+    snapshot = logic.load_day_snapshot("20250528")
+    # inactive teacher3 is kept for name lookups but is never available
+    assert [row.teacher_id for row in snapshot.teachers] == [1, 2, 3]
+    assert [row.teacher_id for row in snapshot.available] == [2]
+    # teacher2 has no absent period, so no row is stored for them
+    assert [absence.teacher_id for absence in snapshot.absences] == [1]
+    assert dict(snapshot.week_counts) == {2: 1}
+    assert dict(snapshot.year_counts) == {2: 2}
+    assert snapshot.schedule == ((9, 2, "2024/2025", "20250528", "period2", "1st"),)
+    with pytest.raises(TypeError):
+        snapshot.week_counts[1] = 5
+
+
+def test_oncall_counts_follow_schedule_changes(temp_db):
+    db_config.execute_query(
+        "INSERT INTO teachers (teacher_id, teacher_name) VALUES (?, ?)", [(1, "teacher1"), (2, "teacher2")]
+    )
+    logic.save_oncall_schedule(
+        [
+            [9, 1, "2024/2025", "20250526", "period1", "1st"],
+            [9, 2, "2024/2025", "20250526", "period1", "2nd"],
+        ]
+    )
+    logic.save_oncall_schedule([[9, 1, "2024/2025", "20250603", "period2", "1st"]])
+    assert logic.get_teacher_oncall_counts(1, "20250528") == (1, 2)
+    assert sorted(logic.get_oncall_totals("2024/2025")) == [["teacher1", 2], ["teacher2", 1]]
+
+    # rescheduling the day replaces its on-calls, and the counters follow
+    logic.save_oncall_schedule([[9, 2, "2024/2025", "20250526", "period1", "1st"]])
+    assert logic.get_weekly_oncall_counts("20250528") == {2: 1}
+    assert logic.get_yearly_oncall_counts(["2024/2025"]) == {"2024/2025": {1: 1, 2: 1}}
+    assert logic.get_teacher_oncall_counts(1, "20250528") == (0, 1)
+
+
+def test_oncall_counts_triggers_only_touch_their_counter(temp_db):
+    db_config.execute_query(
+        "INSERT INTO teachers (teacher_id, teacher_name) VALUES (?, ?)", [(1, "teacher1"), (2, "teacher2")]
+    )
+    logic.save_oncall_schedule([[9, 1, "2024/2025", "20250526", "period1", "1st"]])
+    # an unrelated empty counter is left for its own trigger to clear
+    db_config.execute_query(
+        "INSERT INTO oncall_counts (teacher_id, year, week_start, count) VALUES (2, '2024/2025', '20250525', 0)"
+    )
+    db_config.execute_query("DELETE FROM oncall_schedule WHERE teacher_id = 1")
+    assert db_config.execute_query("SELECT teacher_id, count FROM oncall_counts").data == [(2, 0)]
@@ -0,0 +1,74 @@
+import json
+import time
+import pytest
+from oncall import cli, profiling
+
+
+@pytest.fixture
+def profiler():
+    profiling.disable()
+    yield profiling.enable()
+    profiling.disable()
+
+
+def test_span_does_nothing_when_disabled():
+    profiling.disable()
+    assert profiling.span("a") is profiling.span("b")
+    assert profiling.profiled(lambda x: x + 1)(1) == 2
+
+
+def test_nested_spans(profiler):
+    @profiling.profiled(category="db")
+    def query():
+        time.sleep(0.01)
+
+    with profiling.span("outer"):
+        query()
+        query()
+    outer, = [record for record in profiler.get_spans() if record.name == "outer"]
+    inner = [record for record in profiler.get_spans() if record.category == "db"]
+    assert len(inner) == 2
+    assert {record.depth for record in inner} == {1}
+    assert outer.depth == 0
+    assert outer.own == pytest.approx(outer.elapsed - sum(record.elapsed for record in inner))
+
+
+def test_iterate_times_only_the_items(profiler):
+    def slow_items():
+        for item in range(2):
+            time.sleep(0.01)
+            yield item
+
+    for _ in profiling.iterate(slow_items(), "read", "excel"):
+        time.sleep(0.03)
+    spans = profiler.get_spans()
+    assert len(spans) == 3
+    assert all(record.elapsed < 0.03 for record in spans)
+
+
+def test_report_and_chrome_trace(profiler, tmp_path, capsys):
+    with profiling.span("schedule"):
+        with profiling.span("SELECT", "db"):
+            pass
+    profiler.report()
+    report = capsys.readouterr().err
+    assert "schedule [python]" in report
+    assert "SELECT [db]" in report
+    profiler.write_chrome_trace(str(tmp_path / "trace.json"))
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    assert [(event["name"], event["cat"], event["ph"]) for event in events] == [
+        ("SELECT", "db", "X"),
+        ("schedule", "python", "X"),
+    ]
+
+
+def test_cli_trace_covers_import_phases(tmp_cwd):
+    (tmp_cwd / "timetable.csv").write_text("Teacher,P1,P2,Lunch,P3,P4\nalice,MATH,,,ENG,SCI\n")
+    assert cli.main(["--db", "cli.db", "--trace", "trace.json", "import", "timetable.csv"]) == 0
+    assert not profiling.is_enabled()
+    events = json.loads((tmp_cwd / "trace.json").read_text())["traceEvents"]
+    names = {(event["name"], event["cat"]) for event in events}
+    assert ("import_schedule_streaming", "python") in names
+    assert ("read_schedule_batches", "excel") in names
+    assert ("handle_new_teachers", "python") in names
+    assert "db" in {event["cat"] for event in events}
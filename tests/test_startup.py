@@ -0,0 +1,89 @@
+import io
+import pathlib
+import subprocess
+import sys
+import pytest
+from oncall import startup
+
+# seconds the core modules (everything main.py and the command line import besides wx) may
+# take to import in a fresh interpreter; raise it only with a good reason
+STARTUP_BUDGET = 1.0
+# the same for main.py, including wx, when wx is installed
+GUI_STARTUP_BUDGET = 2.5
+ROOT = pathlib.Path(__file__).parents[1]
+
+
+def cold_import_seconds(modules: str, check: str = "") -> float:
+    """Import modules in a fresh interpreter and return how long it took."""
+    code = (
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {modules}\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"{check}\n"
+        "print(elapsed)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT)
+    assert result.returncode == 0, result.stderr
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def test_lazy_import_defers_until_first_use():
+    code = (
+        "import sys\n"
+        "from oncall.startup import lazy_import\n"
+        "decimal = lazy_import('decimal')\n"
+        "assert '_pydecimal' not in sys.modules and 'numbers' not in sys.modules\n"
+        "assert str(decimal.Decimal('1.5')) == '1.5'\n"
+        "assert 'numbers' in sys.modules\n"
+        "assert lazy_import('decimal') is decimal\n"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=ROOT)
+    assert result.returncode == 0, result.stderr
+
+
+def test_lazy_import_missing_module():
+    with pytest.raises(ModuleNotFoundError):
+        startup.lazy_import("oncall.no_such_module")
+
+
+def test_import_profiler_reports_imports():
+    profiler = startup.ImportProfiler()
+    profiler.install()
+    try:
+        import oncall.tests_startup_probe  # noqa: F401
+    except ModuleNotFoundError:
+        pass
+    finally:
+        profiler.uninstall()
+    profiler.mark("done")
+    assert "oncall.tests_startup_probe" in profiler.timings
+    own, cumulative = profiler.timings["oncall.tests_startup_probe"]
+    assert 0 <= own <= cumulative
+    out = io.StringIO()
+    profiler.report(out)
+    assert "oncall.tests_startup_probe" in out.getvalue()
+    assert "done" in out.getvalue()
+
+
+def test_profiling_requested(monkeypatch):
+    monkeypatch.delenv("ONCALL_PROFILE_STARTUP", raising=False)
+    assert not startup.profiling_requested(["main.py"])
+    assert startup.profiling_requested(["main.py", "--profile-startup"])
+    monkeypatch.setenv("ONCALL_PROFILE_STARTUP", "1")
+    assert startup.profiling_requested(["main.py"])
+
+
+def test_cold_start_within_budget():
+    elapsed = cold_import_seconds(
+        "oncall.cli, oncall.logic, oncall.helper_classes",
+        # the timetable libraries must wait until a timetable is imported
+        "assert 'polars.dataframe' not in sys.modules and 'wx' not in sys.modules",
+    )
+    assert elapsed < STARTUP_BUDGET
+
+
+def test_gui_cold_start_within_budget():
+    pytest.importorskip("wx")
+    elapsed = cold_import_seconds("main", "assert 'polars.dataframe' not in sys.modules")
+    assert elapsed < GUI_STARTUP_BUDGET
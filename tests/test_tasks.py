@@ -0,0 +1,110 @@
+import threading
+import pytest
+from oncall import db_config, logic, tasks
+
+
+@pytest.fixture
+def executor():
+    executor = tasks.TaskExecutor(max_workers=1)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+def test_task_success_and_error(executor):
+    results = []
+    task = executor.submit(sum, [1, 2, 3], on_success=results.append)
+    assert task.result(timeout=5) == 6
+    task = executor.submit(int, "x", on_error=results.append)
+    assert task.result(timeout=5) is None
+    assert results[0] == 6 and isinstance(results[1], ValueError)
+    # without on_error the error is kept for result()
+    with pytest.raises(ValueError):
+        executor.submit(int, "x").result(timeout=5)
+
+
+def test_callbacks_go_through_dispatch():
+    calls = []
+
+    def dispatch(func, *args):
+        calls.append(func.__name__)
+        func(*args)
+
+    def work():
+        tasks.report_progress(1, 2, "half way")
+        return "done"
+
+    def on_progress(done, total, message):
+        assert (done, total, message) == (1, 2, "half way")
+
+    def on_success(result):
+        assert result == "done"
+
+    executor = tasks.TaskExecutor(dispatch=dispatch)
+    executor.submit(work, on_progress=on_progress, on_success=on_success).result(timeout=5)
+    executor.shutdown(wait=True)
+    assert calls == ["on_progress", "on_success"]
+
+
+def test_helpers_do_nothing_outside_a_task():
+    assert tasks.current_task() is None
+    tasks.report_progress(1, 2)
+    tasks.check_cancelled()
+
+
+def test_cancel_running_and_pending_tasks(executor):
+    started, release = threading.Event(), threading.Event()
+    cancelled = []
+
+    def work():
+        started.set()
+        release.wait(5)
+        tasks.check_cancelled()
+        return "finished"
+
+    running = executor.submit(work, on_cancelled=lambda: cancelled.append("running"))
+    pending = executor.submit(work, on_cancelled=lambda: cancelled.append("pending"))
+    assert started.wait(5)
+    pending.cancel()
+    running.cancel()
+    release.set()
+    assert running.result(timeout=5) is None
+    assert pending.future.cancelled()
+    assert sorted(cancelled) == ["pending", "running"]
+
+
+def test_cancelled_task_skips_on_success(executor):
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def work():
+        # never calls check_cancelled
+        started.set()
+        release.wait(5)
+        return "finished"
+
+    task = executor.submit(work, on_success=calls.append, on_cancelled=lambda: calls.append("cancelled"))
+    assert started.wait(5)
+    task.cancel()
+    release.set()
+    assert task.result(timeout=5) is None
+    assert calls == ["cancelled"]
+
+
+def test_cancelled_import_rolls_back(temp_db, executor):
+    (temp_db / "timetable.csv").write_text(
+        "Teacher,P1,P2,Lunch,P3,P4\n" + "".join(f"teacher{n},A,B,,C,\n" for n in range(10))
+    )
+    progress = []
+
+    def on_progress(done, total, message):
+        progress.append(done)
+        # without a dispatch function the callback runs on the worker, inside the task
+        tasks.current_task().cancel()
+
+    task = executor.submit(
+        logic.import_schedule_streaming, "timetable.csv", batch_size=3, on_progress=on_progress
+    )
+    assert task.result(timeout=5) is None
+    assert progress == [3]
+    # nothing the worker wrote before it was cancelled was committed
+    assert db_config.execute_query("SELECT COUNT(*) FROM teachers").data == [(0,)]